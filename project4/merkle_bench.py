@@ -0,0 +1,166 @@
+import argparse
+import json
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from merkletree import DIGEST_SIZE, HASH_BACKENDS, MerkleTree, leaf_hash, set_hash_backend, verify_audit_path
+
+# 慢速后端默认只测到这个规模，可用 --limit 覆盖
+DEFAULT_LIMITS = {'gmssl': 10000}
+# 回归检查的指标，以及数值越大越好还是越小越好
+CHECKED_METRICS = {
+    'build_s': 'lower',
+    'peak_rss_kb': 'lower',
+    'proofs_per_s': 'higher',
+    'verifies_per_s': 'higher',
+    'mean_proof_bytes': 'lower',
+}
+
+
+def run_once(size, backend, samples=10000, seed=0):
+    """在独立进程中运行：构建size个叶子的树并测量证明生成与验证，返回各项指标"""
+    set_hash_backend(backend)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    t_start = time.perf_counter()
+    leaves = bytearray(size * DIGEST_SIZE)
+    for i in range(size):
+        leaves[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE] = leaf_hash(i.to_bytes(8, 'big'))
+    tree = MerkleTree.from_leaf_hashes(leaves)
+    del leaves
+    build_s = time.perf_counter() - t_start
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    rng = random.Random(seed)
+    indices = [rng.randrange(size) for _ in range(samples)]
+    t_start = time.perf_counter()
+    paths = [tree.audit_path(i) for i in indices]
+    proof_s = time.perf_counter() - t_start
+
+    root = tree.root
+    leaves = [tree.leaf(i) for i in indices]
+    t_start = time.perf_counter()
+    ok = all(verify_audit_path(leaf, i, size, p, root) for leaf, i, p in zip(leaves, indices, paths))
+    verify_s = time.perf_counter() - t_start
+
+    proof_bytes = [len(p) * DIGEST_SIZE for p in paths]
+    return {
+        'size': size,
+        'backend': backend,
+        'build_s': build_s,
+        'leaves_per_s': size / build_s,
+        'peak_rss_kb': peak_rss_kb,
+        'rss_before_kb': rss_before,
+        'proofs_per_s': samples / proof_s,
+        'verifies_per_s': samples / verify_s,
+        'mean_proof_bytes': sum(proof_bytes) / samples,
+        'max_proof_bytes': max(proof_bytes),
+        'correct': ok,
+    }
+
+
+def run_repeated(size, backend, samples, repeats):
+    """同一规模运行repeats次，每次在新进程中。受检指标取最好的一次（耗时、内存取最小，吞吐取最大），
+    其余数值指标取中位数；其他负载造成的单次变慢不会被当作退化"""
+    runs = []
+    for _ in range(repeats):
+        # 每次在新进程中运行，峰值RSS只反映这一次构建
+        with ProcessPoolExecutor(1) as pool:
+            runs.append(pool.submit(run_once, size, backend, samples).result())
+    result = {'size': size, 'backend': backend, 'repeats': repeats}
+    for key in runs[0]:
+        if key in result or key == 'correct':
+            continue
+        values = [r[key] for r in runs]
+        better = CHECKED_METRICS.get(key)
+        result[key] = min(values) if better == 'lower' else max(values) if better == 'higher' else statistics.median(values)
+    result['leaves_per_s'] = size / result['build_s']
+    result['correct'] = all(r['correct'] for r in runs)
+    return result
+
+
+def check_regressions(results, baseline, tolerance):
+    """与基线逐项比较，返回超出容差的退化列表"""
+    base = {(r['size'], r['backend']): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        old = base.get((r['size'], r['backend']))
+        if old is None:
+            continue
+        for metric, better in CHECKED_METRICS.items():
+            if metric not in old:
+                continue
+            worse, base_value = (r[metric], old[metric]) if better == 'lower' else (old[metric], r[metric])
+            if base_value == 0:
+                ratio = 0 if worse == 0 else float('inf')
+            else:
+                ratio = worse / base_value - 1
+            if ratio > tolerance:
+                regressions.append({'size': r['size'], 'backend': r['backend'], 'metric': metric,
+                                    'baseline': old[metric], 'current': r[metric], 'worse_by': ratio})
+    return regressions
+
+
+def parse_limits(items):
+    limits = dict(DEFAULT_LIMITS)
+    for item in items:
+        name, value = item.split('=')
+        limits[name] = int(value)
+    return limits
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merkle树规模测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10 ** k for k in range(3, 8)])
+    parser.add_argument('--backends', nargs='+', choices=sorted(HASH_BACKENDS), default=sorted(HASH_BACKENDS))
+    parser.add_argument('--limit', action='append', default=[], metavar='BACKEND=N',
+                        help="某后端最多测试的叶子数，默认gmssl=10000")
+    parser.add_argument('--samples', type=int, default=10000, help="证明生成与验证的次数")
+    parser.add_argument('--repeats', type=int, default=5, help="每个规模运行的次数，各指标取中位数")
+    parser.add_argument('--output', default='merkle_bench.json')
+    parser.add_argument('--baseline', help="与之前的结果文件比较，出现退化时返回非0")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="允许的相对退化比例")
+    args = parser.parse_args(argv)
+    limits = parse_limits(args.limit)
+
+    results = []
+    for backend in args.backends:
+        for size in args.sizes:
+            if size > limits.get(backend, size):
+                print(f"{backend} n={size}: 跳过（超过--limit）")
+                continue
+            res = run_repeated(size, backend, args.samples, args.repeats)
+            results.append(res)
+            print(f"{backend} n={size}: 构建{res['build_s']:.2f}s（{res['leaves_per_s']:.0f}叶子/秒）, "
+                  f"峰值RSS {res['peak_rss_kb'] / 1024:.0f}MB, 证明{res['proofs_per_s']:.0f}次/秒, "
+                  f"验证{res['verifies_per_s']:.0f}次/秒, 证明平均{res['mean_proof_bytes']:.0f}字节, "
+                  f"正确={res['correct']}")
+
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"结果已写入 {args.output}")
+
+    failed = [r for r in results if not r['correct']]
+    for r in failed:
+        print(f"错误: {r['backend']} n={r['size']} 的审计路径验证失败")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = check_regressions(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"退化: {r['backend']} n={r['size']} {r['metric']} {r['baseline']:.4g} -> {r['current']:.4g}"
+                  f"（差{r['worse_by']:.0%}）")
+        if regressions:
+            return 1
+        print("与基线相比没有超出容差的退化")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import string
+import time
+
+from merkletree import (DIGEST_SIZE, MerkleTree, leaf_hash, node_hash, random_string_generate, sm3_digest,
+                        verify_audit_path)
+
+
+def largest_power_of_two_below(n):
+    """小于n的最大2的幂（n > 1）"""
+    return 1 << ((n - 1).bit_length() - 1)
+
+
+class MerkleLog:
+    """只追加的RFC 6962 Merkle日志
+
+    levels[l] 只保存完整子树（2^l个叶子）的根，frontier 保存右边缘各完整子树的根，
+    与size的二进制位一一对应。追加一个叶子最多合并log n次，根哈希只需折叠frontier。
+    keep_levels=False时只维护frontier（O(log n)内存），只能取当前根哈希，不能生成证明"""
+
+    def __init__(self, keep_levels=True):
+        self.keep_levels = keep_levels
+        self.levels = [bytearray()]
+        self.frontier = []  # [(层号, 摘要)]，层号自左向右递减
+        self.size = 0
+
+    def append(self, record):
+        """追加一条记录，返回其叶子下标"""
+        data = record.encode() if isinstance(record, str) else record
+        return self.append_leaf_hash(leaf_hash(data))
+
+    def append_leaf_hash(self, digest):
+        index = self.size
+        self.size += 1
+        if self.keep_levels:
+            self.levels[0] += digest
+        level = 0
+        # 与二进制加法进位相同：同层的两棵完整子树合并成上一层
+        while self.frontier and self.frontier[-1][0] == level:
+            _, left = self.frontier.pop()
+            digest = node_hash(left, digest)
+            level += 1
+            if self.keep_levels:
+                if level == len(self.levels):
+                    self.levels.append(bytearray())
+                self.levels[level] += digest
+        self.frontier.append((level, digest))
+        return index
+
+    def extend(self, record_list):
+        for r in record_list:
+            self.append(r)
+
+    @property
+    def root(self):
+        if not self.frontier:
+            return sm3_digest(b'')
+        digest = self.frontier[-1][1]
+        for _, left in reversed(self.frontier[:-1]):
+            digest = node_hash(left, digest)
+        return digest
+
+    def node(self, level, index):
+        return bytes(self.levels[level][index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE])
+
+    def leaf(self, index):
+        return self.node(0, index)
+
+    def subtree_hash(self, start, end):
+        """MTH(D[start:end])：完整对齐的子树直接读取，否则按最大2的幂划分递归"""
+        count = end - start
+        if count == 0:
+            return sm3_digest(b'')
+        level = count.bit_length() - 1
+        if count == 1 << level and start % count == 0:
+            return self.node(level, start >> level)
+        k = largest_power_of_two_below(count)
+        return node_hash(self.subtree_hash(start, start + k), self.subtree_hash(start + k, end))
+
+    def root_at(self, size):
+        """历史版本（前size个叶子）的根哈希"""
+        if size > self.size:
+            raise ValueError("tree size out of range")
+        return self.subtree_hash(0, size)
+
+    def audit_path(self, index, size=None):
+        """叶子index在前size个叶子构成的树中的审计路径"""
+        size = self.size if size is None else size
+        if not 0 <= index < size <= self.size:
+            raise IndexError("leaf index out of range")
+        path = []
+        start, end = 0, size
+        while end - start > 1:
+            k = largest_power_of_two_below(end - start)
+            if index < start + k:
+                path.append(self.subtree_hash(start + k, end))
+                end = start + k
+            else:
+                path.append(self.subtree_hash(start, start + k))
+                start += k
+        path.reverse()
+        return path
+
+    def consistency_proof(self, first, second=None):
+        """RFC 6962 2.1.2：证明前first个叶子的树是前second个叶子的树的前缀"""
+        second = self.size if second is None else second
+        if not 0 <= first <= second <= self.size:
+            raise ValueError("tree size out of range")
+        if first == 0 or first == second:
+            return []
+        path = []
+        start, end, m = 0, second, first  # m为旧树在当前子树中的叶子数
+        complete = True  # 对应RFC中的b：旧树是否恰好是当前子树
+        while m != end - start:
+            k = largest_power_of_two_below(end - start)
+            if m <= k:
+                path.append(self.subtree_hash(start + k, end))
+                end = start + k
+            else:
+                path.append(self.subtree_hash(start, start + k))
+                start += k
+                m -= k
+                complete = False
+        if not complete:
+            path.append(self.subtree_hash(start, end))
+        path.reverse()
+        return path
+
+
+def verify_consistency(first, second, first_root, second_root, path):
+    """RFC 9162 2.1.4.2的一致性证明验证，只依赖两个根哈希和证明本身"""
+    if first > second:
+        return False
+    if first == second:
+        return not path and first_root == second_root
+    if first == 0:
+        return not path
+    if not path:
+        return False
+    if first & (first - 1) == 0:  # first是2的幂时旧根本身就是第一个节点
+        path = [first_root] + list(path)
+    fn, sn = first - 1, second - 1
+    while fn & 1:
+        fn >>= 1
+        sn >>= 1
+    fr = sr = path[0]
+    for c in path[1:]:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            fr = node_hash(c, fr)
+            sr = node_hash(c, sr)
+            while not fn & 1 and fn:
+                fn >>= 1
+                sn >>= 1
+        else:
+            sr = node_hash(sr, c)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and fr == first_root and sr == second_root
+
+
+def compare_append(num):
+    """对比逐条追加与每次追加后重建整棵树的耗时"""
+    allowed_chars = string.ascii_letters + string.punctuation
+    records = [random_string_generate(5, allowed_chars) for i in range(num)]
+    log = MerkleLog()
+    t_start = time.perf_counter()
+    log.extend(records)
+    t_mid = time.perf_counter()
+    tree = MerkleTree.from_records(records)  # 重建一次的耗时，即原方式每追加一条的代价
+    t_end = time.perf_counter()
+    append_us = (t_mid - t_start) / num * 1e6
+    print("追加{}条: 平均每条{:.1f}us（{:.0f}条/秒），重建整棵树一次{:.3f}s，根哈希一致: {}".format(
+        num, append_us, num / (t_mid - t_start), t_end - t_mid, log.root == tree.root))
+
+
+# 测试示例
+if __name__ == "__main__":
+    record_list = ['a', 'b', 'c', 'd', 'e', 'aa', 'cc', 'bb', 'dd']
+    log = MerkleLog()
+    history = []
+    for r in record_list:
+        log.append(r)
+        history.append(log.root)
+    print("日志大小:", log.size, "根哈希:", log.root.hex())
+    print("与MerkleTree根哈希一致:", log.root == MerkleTree.from_records(record_list).root)
+
+    index = record_list.index('aa')
+    print("'aa'的审计路径验证:", verify_audit_path(log.leaf(index), index, log.size, log.audit_path(index), log.root))
+
+    for first in (1, 3, 4, 6):
+        proof = log.consistency_proof(first)
+        print("大小{}到{}的一致性证明: {}个节点, 验证{}".format(
+            first, log.size, len(proof), verify_consistency(first, log.size, history[first - 1], log.root, proof)))
+
+    compare_append(2000)
@@ -0,0 +1,104 @@
+import mmap
+import os
+import string
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from merkletree import DIGEST_SIZE, MerkleTree, hash_level, leaf_hash, level_sizes, random_string_generate
+from merkle_store import HEADER, MAGIC, MappedMerkleTree, tree_file_size
+
+# 没有指定文件时在tmpfs上构建，各进程共享同一块内存映射
+SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def level_offsets(count):
+    """树文件中各层摘要数组的起始偏移"""
+    offsets = []
+    off = HEADER.size
+    for s in level_sizes(count):
+        offsets.append(off)
+        off += s * DIGEST_SIZE
+    return offsets
+
+
+def _ceil_shift(x, l):
+    return (x + (1 << l) - 1) >> l
+
+
+def _build_subtree(args):
+    """工作进程：计算叶子[start, end)所在子树的第0层到第top层，直接写入共享映射"""
+    path, count, start, records, top = args
+    end = start + len(records)
+    offsets = level_offsets(count)
+    with open(path, 'r+b') as f, mmap.mmap(f.fileno(), 0) as mm:
+        view = memoryview(mm)
+        off = offsets[0] + start * DIGEST_SIZE
+        for r in records:
+            view[off:off + DIGEST_SIZE] = leaf_hash(r.encode() if isinstance(r, str) else r)
+            off += DIGEST_SIZE
+        # start按2^top对齐，子树内各层节点区间互不重叠，提升的节点也只依赖子树内的叶子
+        for l in range(top):
+            lo, hi = start >> l, _ceil_shift(end, l)
+            nlo, nhi = start >> (l + 1), _ceil_shift(end, l + 1)
+            hash_level(view[offsets[l] + lo * DIGEST_SIZE:offsets[l] + hi * DIGEST_SIZE],
+                       view[offsets[l + 1] + nlo * DIGEST_SIZE:offsets[l + 1] + nhi * DIGEST_SIZE])
+        view.release()
+        mm.flush()
+
+
+def parallel_build_file(path, record_list, workers=os.cpu_count(), subtrees_per_worker=4):
+    """把叶子划分为2^top大小的子树，由工作进程写入映射文件，父进程再合并顶部各层"""
+    count = len(record_list)
+    sizes = level_sizes(count)
+    size = tree_file_size(count)
+    with open(path, 'w+b') as f:
+        f.truncate(size)
+        f.write(HEADER.pack(MAGIC, DIGEST_SIZE, len(sizes), count))
+
+    target = max(1, count // (workers * subtrees_per_worker))
+    top = target.bit_length() - 1  # 子树大小取不超过target的最大2的幂
+    chunk = 1 << top
+    tasks = [(path, count, s, record_list[s:s + chunk], top) for s in range(0, count, chunk)]
+    with ProcessPoolExecutor(workers) as pool:
+        list(pool.map(_build_subtree, tasks))
+
+    offsets = level_offsets(count)
+    with open(path, 'r+b') as f, mmap.mmap(f.fileno(), 0) as mm:
+        view = memoryview(mm)
+        for l in range(top, len(sizes) - 1):
+            hash_level(view[offsets[l]:offsets[l] + sizes[l] * DIGEST_SIZE],
+                       view[offsets[l + 1]:offsets[l + 1] + sizes[l + 1] * DIGEST_SIZE])
+        view.release()
+        mm.flush()
+    return MappedMerkleTree(path)
+
+
+def parallel_build(record_list, workers=os.cpu_count()):
+    """并行构建并返回内存中的MerkleTree，中间结果放在tmpfs上的共享映射中"""
+    fd, path = tempfile.mkstemp(prefix='merkle_', suffix='.mkt', dir=SHM_DIR)
+    os.close(fd)
+    try:
+        tree = parallel_build_file(path, record_list, workers)
+        levels = [bytearray(level) for level in tree.levels]
+        tree.close()
+    finally:
+        os.remove(path)
+    return MerkleTree(levels)
+
+
+# 测试示例
+if __name__ == "__main__":
+    allowed_chars = string.ascii_letters + string.punctuation
+    records = [random_string_generate(5, allowed_chars) for i in range(500000)]
+
+    t_start = time.perf_counter()
+    serial = MerkleTree.from_records(records)
+    t_serial = time.perf_counter() - t_start
+    print("串行构建{}叶子: {:.3f}s".format(len(records), t_serial))
+    for workers in sorted({1, 2, os.cpu_count()}):
+        t_start = time.perf_counter()
+        tree = parallel_build(records, workers)
+        t_par = time.perf_counter() - t_start
+        print("{}个进程并行构建: {:.3f}s（加速{:.2f}倍），根哈希与串行一致: {}".format(
+            workers, t_par, t_serial / t_par, tree.root == serial.root))
@@ -0,0 +1,226 @@
+import asyncio
+import os
+import random
+import string
+import struct
+import tempfile
+import time
+from collections import OrderedDict
+
+from merkletree import DIGEST_SIZE, MerkleTree, random_string_generate, verify_audit_path
+from merkle_store import MappedMerkleTree, build_tree_file
+
+# 连接建立后服务端先发送：树大小(8字节) | 根哈希(32字节)
+HELLO = struct.Struct('>Q32s')
+# 请求：请求号(4字节) | 叶子下标(8字节)
+REQUEST = struct.Struct('>IQ')
+# 响应：请求号 | 叶子下标 | 路径节点数(1字节)，之后是叶子哈希和路径节点；下标越界时节点数为ERROR且没有摘要
+RESPONSE = struct.Struct('>IQB')
+ERROR = 0xff
+
+
+class LRUCache:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.capacity:
+            self.data.popitem(last=False)
+
+
+class ProofServer:
+    """审计路径服务：tree可以是内存中的MerkleTree或MappedMerkleTree
+
+    最上面hot_levels层的节点和最近的证明各有一个LRU缓存；各连接的请求汇入同一队列，
+    由一个批处理协程一次取出所有积压请求，按连接合并响应后各写一次"""
+
+    def __init__(self, tree, proof_cache_size=4096, node_cache_size=1 << 16, hot_levels=16, max_batch=256):
+        self.tree = tree
+        self.widths = [len(level) // DIGEST_SIZE for level in tree.levels]
+        self.hot_from = max(0, tree.height - 1 - hot_levels)
+        self.nodes = LRUCache(node_cache_size)
+        self.proofs = LRUCache(proof_cache_size)
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        self.batcher = None
+        self.stats = {'requests': 0, 'batches': 0}
+
+    def node(self, level, index):
+        if level < self.hot_from:
+            return self.tree.node(level, index)
+        key = (level, index)
+        digest = self.nodes.get(key)
+        if digest is None:
+            digest = self.tree.node(level, index)
+            self.nodes.put(key, digest)
+        return digest
+
+    def proof(self, index):
+        """返回 (路径节点数, 叶子哈希 + 路径节点)，与MerkleTree.audit_path相同"""
+        cached = self.proofs.get(index)
+        if cached is not None:
+            return cached
+        if not 0 <= index < self.tree.size:
+            return ERROR, b''
+        parts = [self.tree.leaf(index)]
+        i = index
+        for level in range(self.tree.height - 1):
+            sibling = i ^ 1
+            if sibling < self.widths[level]:
+                parts.append(self.node(level, sibling))
+            i >>= 1
+        result = len(parts) - 1, b''.join(parts)
+        self.proofs.put(index, result)
+        return result
+
+    async def _batch_loop(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            replies = {}
+            for writer, req_id, index in batch:
+                count, payload = self.proof(index)
+                replies.setdefault(writer, []).append(RESPONSE.pack(req_id, index, count) + payload)
+            for writer, parts in replies.items():
+                if not writer.is_closing():
+                    writer.write(b''.join(parts))
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+
+    async def handle(self, reader, writer):
+        writer.write(HELLO.pack(self.tree.size, self.tree.root))
+        try:
+            while True:
+                req_id, index = REQUEST.unpack(await reader.readexactly(REQUEST.size))
+                await self.queue.put((writer, req_id, index))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _start_batcher(self):
+        if self.batcher is None:
+            self.batcher = asyncio.create_task(self._batch_loop())
+
+    async def start_tcp(self, host='127.0.0.1', port=0):
+        self._start_batcher()
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def start_unix(self, path):
+        self._start_batcher()
+        return await asyncio.start_unix_server(self.handle, path)
+
+    def cache_stats(self):
+        return {
+            'batches': self.stats['batches'],
+            'mean_batch': self.stats['requests'] / max(1, self.stats['batches']),
+            'proof_hit_rate': self.proofs.hits / max(1, self.proofs.hits + self.proofs.misses),
+            'node_hit_rate': self.nodes.hits / max(1, self.nodes.hits + self.nodes.misses),
+        }
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+async def run_load(connect, requests, connections=32, window=4, hot_fraction=0.01, hot_share=0.8,
+                   verify_every=100, seed=0):
+    """负载生成：connections个连接，每个连接保持window个未完成请求；
+    hot_share比例的请求落在前hot_fraction的叶子上。每verify_every个响应验证一次"""
+    latencies = []
+    failures = 0
+
+    async def client(n_requests, rng):
+        nonlocal failures
+        reader, writer = await connect()
+        size, root = HELLO.unpack(await reader.readexactly(HELLO.size))
+        hot = max(1, int(size * hot_fraction))
+        sent_at = {}
+        next_id = 0
+
+        def send():
+            nonlocal next_id
+            index = rng.randrange(hot) if rng.random() < hot_share else rng.randrange(size)
+            sent_at[next_id] = time.perf_counter()
+            writer.write(REQUEST.pack(next_id, index))
+            next_id += 1
+
+        for _ in range(min(window, n_requests)):
+            send()
+        for done in range(n_requests):
+            req_id, index, count = RESPONSE.unpack(await reader.readexactly(RESPONSE.size))
+            payload = await reader.readexactly((count + 1) * DIGEST_SIZE) if count != ERROR else b''
+            latencies.append(time.perf_counter() - sent_at.pop(req_id))
+            if done % verify_every == 0:
+                path = [payload[k:k + DIGEST_SIZE] for k in range(DIGEST_SIZE, len(payload), DIGEST_SIZE)]
+                if count == ERROR or not verify_audit_path(payload[:DIGEST_SIZE], index, size, path, root):
+                    failures += 1
+            if next_id < n_requests:
+                send()
+        writer.close()
+
+    per_conn = requests // connections
+    t_start = time.perf_counter()
+    await asyncio.gather(*(client(per_conn, random.Random(seed + c)) for c in range(connections)))
+    elapsed = time.perf_counter() - t_start
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1e3,
+        'p90_ms': percentile(latencies, 0.90) * 1e3,
+        'p99_ms': percentile(latencies, 0.99) * 1e3,
+        'verify_failures': failures,
+    }
+
+
+# 测试示例
+async def main():
+    allowed_chars = string.ascii_letters + string.punctuation
+    records = [random_string_generate(5, allowed_chars) for i in range(200000)]
+    workdir = tempfile.mkdtemp(prefix='merkle_server_')
+
+    # 内存中的树，TCP
+    server = ProofServer(MerkleTree.from_records(records))
+    tcp = await server.start_tcp()
+    port = tcp.sockets[0].getsockname()[1]
+    report = await run_load(lambda: asyncio.open_connection('127.0.0.1', port), 20000)
+    tcp.close()
+    await tcp.wait_closed()
+    print("内存树/TCP:", {k: round(v, 3) for k, v in report.items()}, server.cache_stats())
+
+    # 映射文件中的树，Unix套接字
+    tree_path = os.path.join(workdir, 'tree.mkt')
+    sock_path = os.path.join(workdir, 'proof.sock')
+    build_tree_file(tree_path, records).close()
+    with MappedMerkleTree(tree_path) as tree:
+        server = ProofServer(tree)
+        unix = await server.start_unix(sock_path)
+        report = await run_load(lambda: asyncio.open_unix_connection(sock_path), 20000)
+        unix.close()
+        await unix.wait_closed()
+    print("映射树/Unix:", {k: round(v, 3) for k, v in report.items()}, server.cache_stats())
+
+    for name in os.listdir(workdir):
+        os.remove(os.path.join(workdir, name))
+    os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
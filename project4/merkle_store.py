@@ -0,0 +1,147 @@
+import mmap
+import os
+import string
+import struct
+import tempfile
+import time
+
+from merkletree import (DIGEST_SIZE, MerkleTree, hash_level, leaf_hash, level_sizes, random_string_generate,
+                        verify_audit_path)
+
+# 文件头：魔数(4字节) | 摘要长度(2字节) | 层数(2字节) | 叶子数(8字节)
+# 之后自底向上依次存放各层的定长摘要数组，第l层有 ceil(n / 2^l) 个摘要
+MAGIC = b'MKT1'
+HEADER = struct.Struct('>4sHHQ')
+
+
+def tree_file_size(count):
+    return HEADER.size + sum(level_sizes(count)) * DIGEST_SIZE
+
+
+def _fill_levels(buf, leaves):
+    """leaves为叶子哈希的可迭代对象，逐个写入第0层后在缓冲区内自底向上计算各层"""
+    off = HEADER.size
+    for digest in leaves:
+        buf[off:off + DIGEST_SIZE] = digest
+        off += DIGEST_SIZE
+    _hash_upper_levels(buf, len(leaves))
+
+
+def _hash_upper_levels(buf, count):
+    """第0层已就位时写入文件头并计算其余各层"""
+    sizes = level_sizes(count)
+    buf[:HEADER.size] = HEADER.pack(MAGIC, DIGEST_SIZE, len(sizes), count)
+    view = memoryview(buf)
+    start = HEADER.size
+    for cur, nxt in zip(sizes, sizes[1:]):
+        mid = start + cur * DIGEST_SIZE
+        hash_level(view[start:mid], view[mid:mid + nxt * DIGEST_SIZE])
+        start = mid
+    view.release()
+
+
+class _LeafHashes:
+    def __init__(self, record_list):
+        self.record_list = record_list
+
+    def __len__(self):
+        return len(self.record_list)
+
+    def __iter__(self):
+        for r in self.record_list:
+            yield leaf_hash(r.encode() if isinstance(r, str) else r)
+
+
+def build_tree_file(path, record_list):
+    """直接在映射文件中构建树，不在内存中保存任何一层；record_list需要支持len()"""
+    size = tree_file_size(len(record_list))
+    with open(path, 'w+b') as f:
+        f.truncate(size)
+        with mmap.mmap(f.fileno(), size) as mm:
+            _fill_levels(mm, _LeafHashes(record_list))
+            mm.flush()
+    return MappedMerkleTree(path)
+
+
+def finish_tree_file(path, count):
+    """文件头之后已顺序写入count个叶子哈希（例如流式构建时），扩展文件并就地计算其余各层"""
+    size = tree_file_size(count)
+    with open(path, 'r+b') as f:
+        f.truncate(size)
+        with mmap.mmap(f.fileno(), size) as mm:
+            _hash_upper_levels(mm, count)
+            mm.flush()
+    return MappedMerkleTree(path)
+
+
+def save_tree(tree, path):
+    """把内存中的MerkleTree写成同样的文件格式"""
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, DIGEST_SIZE, tree.height, tree.size))
+        for level in tree.levels:
+            f.write(level)
+
+
+class MappedMerkleTree(MerkleTree):
+    """以只读mmap打开树文件，各层是映射上的memoryview，打开时不读取任何节点，
+    内存占用由页缓存决定；审计路径直接从映射读取兄弟节点"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fp = open(path, 'rb')
+        self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, digest_size, height, count = HEADER.unpack_from(self.mm)
+        if magic != MAGIC or digest_size != DIGEST_SIZE:
+            raise ValueError("not a merkle tree file")
+        sizes = level_sizes(count)
+        if len(sizes) != height or len(self.mm) != tree_file_size(count):
+            raise ValueError("corrupt merkle tree file")
+        self.view = memoryview(self.mm)
+        levels = []
+        off = HEADER.size
+        for s in sizes:
+            levels.append(self.view[off:off + s * DIGEST_SIZE])
+            off += s * DIGEST_SIZE
+        super().__init__(levels)
+
+    def close(self):
+        # 先释放所有memoryview，mmap才能关闭
+        for level in self.levels:
+            level.release()
+        self.view.release()
+        self.mm.close()
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# 测试示例
+if __name__ == "__main__":
+    allowed_chars = string.ascii_letters + string.punctuation
+    records = [random_string_generate(5, allowed_chars) for i in range(5000)]
+    path = os.path.join(tempfile.mkdtemp(prefix='merkle_store_'), 'tree.mkt')
+
+    t_start = time.perf_counter()
+    build_tree_file(path, records).close()
+    t_build = time.perf_counter() - t_start
+
+    t_start = time.perf_counter()
+    with MappedMerkleTree(path) as tree:
+        t_open = time.perf_counter() - t_start
+        print("文件构建{}叶子: {:.3f}s, 文件{}字节, 打开耗时{:.1f}us".format(
+            tree.size, t_build, os.path.getsize(path), t_open * 1e6))
+        print("与内存构建根哈希一致:", tree.root == MerkleTree.from_records(records).root)
+        index = 1234
+        path_nodes = tree.audit_path(index)
+        print("叶子{}的审计路径验证: {}".format(
+            index, verify_audit_path(tree.leaf(index), index, tree.size, path_nodes, tree.root)))
+        t_start = time.perf_counter()
+        for i in range(10000):
+            tree.audit_path(i % tree.size)
+        print("从映射生成审计路径平均耗时: {:.2f}us".format((time.perf_counter() - t_start) / 10000 * 1e6))
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
@@ -1,6 +1,8 @@
 from gmssl import sm3, func
+import hashlib
 import random
 import string
+import struct
 import math
 import time
 
@@ -39,32 +41,6 @@ def create(record_list):
     return lst, height, table
 
 
-record_list = [ 'jing', 'dd', 'dddd', 'w', 'aa', 'n', 'ddd', 'e', 'ee', 'qq', 'wfag', 'aaa', 'bb']
-listt, height, table = create(record_list)
-print("proof:", listt)
-#print("所有层级哈希值:",table)
-print("height:", height)
-
-'''
-#十万叶子节点,计时
-def random_string_generate(size,allowed_chars):
-    return ''.join(random.choice(allowed_chars)for x in range(size))
-
-allowed_chars=string.ascii_letters+string.punctuation
-
-record_list=[]
-num=100000
-for i in range(num):
-    record_list.append(random_string_generate(5,allowed_chars))
-print("ok")
-t_start=time.time()
-listt,height,table=create(record_list)
-t_end=time.time()
-print("height:",height)
-print("创建{}叶子节点的merkle tree所需时间为{}s".format(num,t_end-t_start))
-
-
-'''
 # 节点包含证明
 def include_proof(tx, pos, height, table):
     lls = []
@@ -97,19 +73,8 @@ def include_proof(tx, pos, height, table):
         return False
     return True
 
-'''
-tx = ('aa')
-print(tx)
-pos = record_list.index(tx)
-tx = sm3.sm3_hash(func.bytes_to_list(tx.encode()))
-print(tx, pos)
-if_exist = include_proof(tx, pos, height, table)
-if if_exist == True:
-    print("该节点存在")
-else:
-    print("该节点不存在")'''
-
 def exclude_proof(pos1,pos2,table):
+    height = len(table)
     try:
 
         temp=sm3.sm3_hash(func.bytes_to_list((table[0][pos1]+table[0][pos2]).encode()))
@@ -141,15 +106,639 @@ def exclude_proof(pos1,pos2,table):
         return False
 
 
+DIGEST_SIZE = 32  # SM3摘要字节数
+
+
+def sm3_digest(data):
+    """SM3，输入为bytes/memoryview，输出32字节原始摘要，由当前哈希后端计算"""
+    return _backend.digest(data)
+
+
+def build_levels(record_list):
+    """数组化构建Merkle树：每层是32字节原始摘要连续存放的bytearray，
+    父节点直接对memoryview切片（左||右，64字节）做哈希，整体O(n)。
+    奇数个节点时与create一样复制最后一个；返回从叶子到根的各层"""
+    if not record_list:
+        raise ValueError("no transactions to be hashed")
+    leaves = bytearray(len(record_list) * DIGEST_SIZE)
+    for i, r in enumerate(record_list):
+        leaves[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE] = sm3_digest(r.encode())
+    levels = [leaves]
+    while len(levels[-1]) > DIGEST_SIZE:
+        cur = memoryview(levels[-1])
+        count = len(cur) // DIGEST_SIZE
+        nxt = bytearray((count + 1) // 2 * DIGEST_SIZE)
+        for i in range(count // 2):
+            nxt[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE] = sm3_digest(cur[2 * i * DIGEST_SIZE:(2 * i + 2) * DIGEST_SIZE])
+        if count % 2:  # 奇数个点，复制最后一个
+            last = bytes(cur[(count - 1) * DIGEST_SIZE:])
+            nxt[-DIGEST_SIZE:] = sm3_digest(last + last)
+        levels.append(nxt)
+    return levels
+
+
+# RFC 6962：叶子 H(0x00 || d)，内部节点 H(0x01 || 左 || 右)
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def leaf_hash(data):
+    return sm3_digest(LEAF_PREFIX + data)
+
+
+def node_hash(left, right):
+    return sm3_digest(NODE_PREFIX + left + right)
+
+
+# 可替换的SM3后端：digest(data)计算单个摘要，hash_pairs(level_buffer, out)把连续存放的
+# 2k个摘要两两作为左右子节点，把k个内部节点 H(0x01 || 左 || 右) 依次写入调用方提供的缓冲区out
+# （例如树文件映射上的切片），不另外分配一层大小的内存
+class GmsslBackend:
+    """纯Python的gmssl实现，输入要转成整数列表、输出是十六进制串，作为后备"""
+    name = 'gmssl'
+
+    def digest(self, data):
+        return bytes.fromhex(sm3.sm3_hash(list(data)))
+
+    def hash_pairs(self, level_buffer, out):
+        view = memoryview(level_buffer)
+        out = memoryview(out)
+        for off in range(0, len(view) - 2 * DIGEST_SIZE + 1, 2 * DIGEST_SIZE):
+            out[off // 2:off // 2 + DIGEST_SIZE] = self.digest(NODE_PREFIX + view[off:off + 2 * DIGEST_SIZE])
+
+
+class OpenSSLBackend:
+    """hashlib中OpenSSL提供的SM3，直接处理字节；内部节点从已吸收0x01前缀的状态复制，
+    每个节点只需一次copy、update和digest"""
+    name = 'openssl'
+
+    def __init__(self):
+        self.base = hashlib.new('sm3')
+        self.node_base = self.base.copy()
+        self.node_base.update(NODE_PREFIX)
+
+    def digest(self, data):
+        h = self.base.copy()
+        h.update(data)
+        return h.digest()
+
+    def hash_pairs(self, level_buffer, out):
+        view = memoryview(level_buffer)
+        out = memoryview(out)
+        node_base = self.node_base
+        for off in range(0, len(view) - 2 * DIGEST_SIZE + 1, 2 * DIGEST_SIZE):
+            h = node_base.copy()
+            h.update(view[off:off + 2 * DIGEST_SIZE])
+            out[off // 2:off // 2 + DIGEST_SIZE] = h.digest()
+
+
+HASH_BACKENDS = {'gmssl': GmsslBackend}
+if 'sm3' in hashlib.algorithms_available:
+    HASH_BACKENDS['openssl'] = OpenSSLBackend
+
+
+def set_hash_backend(name):
+    """切换树使用的SM3后端，返回切换前的后端；两种后端的结果逐字节相同"""
+    global _backend
+    previous = _backend
+    _backend = HASH_BACKENDS[name]()
+    return previous
+
+
+def get_hash_backend():
+    return _backend
+
+
+# 默认使用OpenSSL，不可用时退回gmssl
+_backend = HASH_BACKENDS.get('openssl', GmsslBackend)()
+
+
+def level_sizes(count):
+    """RFC 6962树自底向上各层的节点数"""
+    sizes = [count]
+    while sizes[-1] > 1:
+        sizes.append((sizes[-1] + 1) // 2)
+    return sizes
+
+
+def hash_level(cur, nxt):
+    """由下层摘要数组cur计算上层写入nxt，两者可以是任意可写缓冲区（bytearray、mmap）"""
+    cur = memoryview(cur)
+    nxt = memoryview(nxt)
+    count = len(cur) // DIGEST_SIZE
+    pairs = count // 2
+    _backend.hash_pairs(cur[:pairs * 2 * DIGEST_SIZE], nxt[:pairs * DIGEST_SIZE])  # 直接写入nxt，不经过中间副本
+    if count % 2:  # 奇数个点，最后一个直接提升
+        nxt[-DIGEST_SIZE:] = cur[-DIGEST_SIZE:]
+
+
+class MerkleTree:
+    """RFC 6962 Merkle树，各层以bytearray存放32字节摘要。
+    某层节点数为奇数时，最后一个节点不做哈希直接提升到上一层，
+    与RFC 6962按不超过n的最大2的幂划分左右子树的定义等价"""
+
+    def __init__(self, levels):
+        self.levels = levels
+
+    @classmethod
+    def from_records(cls, record_list):
+        leaves = bytearray(len(record_list) * DIGEST_SIZE)
+        for i, r in enumerate(record_list):
+            data = r.encode() if isinstance(r, str) else r
+            leaves[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE] = leaf_hash(data)
+        return cls.from_leaf_hashes(leaves)
+
+    @classmethod
+    def from_leaf_hashes(cls, leaves):
+        levels = [bytearray(leaves)]
+        while len(levels[-1]) > DIGEST_SIZE:
+            count = len(levels[-1]) // DIGEST_SIZE
+            nxt = bytearray((count + 1) // 2 * DIGEST_SIZE)
+            hash_level(levels[-1], nxt)
+            levels.append(nxt)
+        return cls(levels)
+
+    @property
+    def size(self):
+        return len(self.levels[0]) // DIGEST_SIZE
+
+    @property
+    def height(self):
+        return len(self.levels)
+
+    @property
+    def root(self):
+        if self.size == 0:
+            return sm3_digest(b'')  # 空树的根为空串的哈希
+        return bytes(self.levels[-1])
+
+    def node(self, level, index):
+        return bytes(self.levels[level][index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE])
+
+    def leaf(self, index):
+        return self.node(0, index)
+
+    def audit_path(self, index):
+        """叶子index的审计路径：每层只读取一个兄弟节点，O(log n)"""
+        if not 0 <= index < self.size:
+            raise IndexError("leaf index out of range")
+        path = []
+        for level in range(self.height - 1):
+            sibling = index ^ 1
+            if sibling * DIGEST_SIZE < len(self.levels[level]):  # 被提升的节点在这一层没有兄弟
+                path.append(self.node(level, sibling))
+            index >>= 1
+        return path
+
+    def multi_proof(self, indices):
+        """多个叶子的合并证明：返回去重排序后的下标和所需节点（按层、层内按下标排列），
+        验证时能由叶子自行算出的节点和共享的兄弟节点都只出现一次"""
+        known = sorted(set(indices))
+        if known and not 0 <= known[0] <= known[-1] < self.size:
+            raise IndexError("leaf index out of range")
+        sorted_indices = known  # 只是下标，叶子哈希由调用方按这些下标自行提供
+        nodes = []
+        for level in range(self.height - 1):
+            width = len(self.levels[level]) // DIGEST_SIZE
+            known_set = set(known)
+            for i in known:
+                sibling = i ^ 1
+                if sibling < width and sibling not in known_set:
+                    nodes.append(self.node(level, sibling))
+            known = sorted({i >> 1 for i in known})
+        return sorted_indices, nodes
+
+
+def verify_audit_path(leaf, index, tree_size, path, root):
+    """RFC 9162 2.1.3.2的审计路径验证，leaf为叶子哈希，只依赖路径本身"""
+    if index >= tree_size:
+        return False
+    fn, sn = index, tree_size - 1
+    r = leaf
+    for p in path:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            r = node_hash(p, r)
+            while not fn & 1 and fn:
+                fn >>= 1
+                sn >>= 1
+        else:
+            r = node_hash(r, p)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and r == root
+
+
+def verify_multi_proof(tree_size, indices, leaves, nodes, root):
+    """自底向上一遍重建根哈希，indices必须严格递增，leaves为对应的叶子哈希"""
+    if not indices or len(indices) != len(leaves) or not 0 <= indices[0] or indices[-1] >= tree_size:
+        return False
+    # 重复或乱序的下标会让伪造的叶子绕过根哈希的比较，必须拒绝
+    if any(a >= b for a, b in zip(indices, indices[1:])):
+        return False
+    known = list(zip(indices, leaves))
+    pos = 0
+    for width in level_sizes(tree_size)[:-1]:
+        parents = []
+        j = 0
+        while j < len(known):
+            i, digest = known[j]
+            if i & 1 == 0 and j + 1 < len(known) and known[j + 1][0] == i + 1:
+                parents.append((i >> 1, node_hash(digest, known[j + 1][1])))
+                j += 2
+                continue
+            if (i ^ 1) < width:  # 兄弟节点由证明提供
+                if pos == len(nodes):
+                    return False
+                sibling = nodes[pos]
+                pos += 1
+                digest = node_hash(sibling, digest) if i & 1 else node_hash(digest, sibling)
+            parents.append((i >> 1, digest))
+            j += 1
+        known = parents
+    return pos == len(nodes) and len(known) == 1 and known[0][1] == root
+
+
+# 合并证明的二进制编码：树大小(8字节) | 叶子数(4字节) | 节点数(4字节) | 下标差分的变长整数 | 节点摘要
+MULTIPROOF_HEADER = struct.Struct('>QII')
+
+
+def encode_multi_proof(tree_size, indices, nodes):
+    out = bytearray(MULTIPROOF_HEADER.pack(tree_size, len(indices), len(nodes)))
+    prev = 0
+    for k, i in enumerate(indices):
+        delta = i - prev
+        if delta < 0 or (k and delta == 0):
+            raise ValueError("multi-proof indices must be strictly increasing")
+        prev = i
+        while delta >= 0x80:  # LEB128，相邻下标越近编码越短
+            out.append(delta & 0x7f | 0x80)
+            delta >>= 7
+        out.append(delta)
+    for digest in nodes:
+        out += digest
+    return bytes(out)
+
+
+def decode_multi_proof(buf):
+    tree_size, leaf_count, node_count = MULTIPROOF_HEADER.unpack_from(buf)
+    off = MULTIPROOF_HEADER.size
+    indices = []
+    prev = 0
+    for k in range(leaf_count):
+        delta = shift = 0
+        while True:
+            if off == len(buf):
+                raise ValueError("truncated multi-proof")
+            b = buf[off]
+            off += 1
+            delta |= (b & 0x7f) << shift
+            shift += 7
+            if b < 0x80:
+                break
+        if k and delta == 0:  # 第一个之后差分为0即重复下标
+            raise ValueError("duplicate index in multi-proof")
+        prev += delta
+        indices.append(prev)
+    if len(buf) != off + node_count * DIGEST_SIZE:
+        raise ValueError("multi-proof length mismatch")
+    nodes = [bytes(buf[off + k * DIGEST_SIZE:off + (k + 1) * DIGEST_SIZE]) for k in range(node_count)]
+    return tree_size, indices, nodes
+
+
+def compare_multi_proof(num, count):
+    """对比num个叶子的树中count个叶子的逐个审计路径与合并证明的大小和验证耗时"""
+    allowed_chars = string.ascii_letters + string.punctuation
+    tree = MerkleTree.from_records([random_string_generate(5, allowed_chars) for i in range(num)])
+    indices = sorted(random.sample(range(num), count))
+    leaves = [tree.leaf(i) for i in indices]
+
+    paths = [tree.audit_path(i) for i in indices]
+    single_bytes = sum(8 + len(p) * DIGEST_SIZE for p in paths)
+    t_start = time.perf_counter()
+    ok_single = all(verify_audit_path(leaf, i, tree.size, p, tree.root) for leaf, i, p in zip(leaves, indices, paths))
+    t_single = time.perf_counter() - t_start
+
+    proof = encode_multi_proof(tree.size, *tree.multi_proof(indices))
+    t_start = time.perf_counter()
+    tree_size, proof_indices, nodes = decode_multi_proof(proof)
+    ok_multi = verify_multi_proof(tree_size, proof_indices, leaves, nodes, tree.root)
+    t_multi = time.perf_counter() - t_start
+    print("{}叶子中证明{}个: 逐个证明{}字节/验证{:.3f}s({}), 合并证明{}字节/验证{:.3f}s({})".format(
+        num, count, single_bytes, t_single, ok_single, len(proof), t_multi, ok_multi))
+
+
+class SparseMerkleTree:
+    """键值稀疏Merkle树：键的SM3摘要的高depth位作为路径，叶子为 H(0x00 || 键摘要 || H(值))，同时绑定键和值
+
+    只含一个键的子树压缩成一个叶子，放在它与其他键分叉的高度上；至少含两个键的子树才是内部节点，
+    空子树的哈希为全0。nodes 只保存内部节点，leaves 保存压缩后的叶子，存储与键数近似成正比。
+    插入、更新、删除和证明只走一条根到叶的路径；两个不同的键路径相同（depth较小时可能出现）时插入报错"""
+
+    def __init__(self, depth=256):
+        self.depth = depth
+        self.nodes = {}  # (高度, 该高度上的下标) -> 内部节点摘要
+        self.leaves = {}  # (高度, 下标) -> (键摘要, 值, 叶子摘要)
+
+    def key_path(self, key_digest):
+        return int.from_bytes(key_digest, 'big') >> (DIGEST_SIZE * 8 - self.depth)
+
+    def _subtree(self, height, index):
+        """高度height、下标index处子树的根：压缩叶子、内部节点或空子树"""
+        leaf = self.leaves.get((height, index))
+        if leaf is not None:
+            return leaf[2]
+        return self.nodes.get((height, index), EMPTY_SUBTREE)
+
+    @property
+    def root(self):
+        return self._subtree(self.depth, 0)
+
+    def _descend(self, path):
+        """沿路径自根向下越过内部节点，返回遇到的第一个叶子或空子树的高度"""
+        height = self.depth
+        while (height, path >> height) in self.nodes:
+            height -= 1
+        return height
+
+    def _rehash(self, height, path):
+        """重算路径上从height到根的内部节点"""
+        for h in range(height, self.depth + 1):
+            index = path >> h
+            self.nodes[(h, index)] = node_hash(self._subtree(h - 1, 2 * index), self._subtree(h - 1, 2 * index + 1))
+
+    def get(self, key):
+        key_digest = sparse_key_digest(key)
+        path = self.key_path(key_digest)
+        height = self._descend(path)
+        leaf = self.leaves.get((height, path >> height))
+        return leaf[1] if leaf is not None and leaf[0] == key_digest else None
+
+    def update(self, key, value):
+        """插入或更新键key的值"""
+        value = value.encode() if isinstance(value, str) else value
+        key_digest = sparse_key_digest(key)
+        path = self.key_path(key_digest)
+        height = self._descend(path)
+        other = self.leaves.get((height, path >> height))
+        if other is not None and other[0] != key_digest:
+            other_path = self.key_path(other[0])
+            if other_path == path:
+                raise ValueError("two keys map to the same path, depth is too small")
+            # 原来独占该子树的键与新键在此高度分叉，各自成为单键子树
+            del self.leaves[(height, path >> height)]
+            height = (path ^ other_path).bit_length() - 1
+            self.leaves[(height, other_path >> height)] = other
+        self.leaves[(height, path >> height)] = (key_digest, value, sparse_leaf_hash(key_digest, value))
+        self._rehash(height + 1, path)
+
+    def delete(self, key):
+        key_digest = sparse_key_digest(key)
+        path = self.key_path(key_digest)
+        height = self._descend(path)
+        leaf = self.leaves.get((height, path >> height))
+        if leaf is None or leaf[0] != key_digest:
+            return
+        del self.leaves[(height, path >> height)]
+        # 兄弟是叶子时父节点只剩一个键，该叶子沿路径上移，直到遇到另一棵非空子树
+        moving = None
+        while height < self.depth:
+            sibling = (height, (path >> height) ^ 1)
+            if moving is None:
+                moving = self.leaves.pop(sibling, None)
+                if moving is None:
+                    break
+            elif sibling in self.leaves or sibling in self.nodes:
+                break
+            height += 1
+            del self.nodes[(height, path >> height)]
+        if moving is not None:
+            self.leaves[(height, path >> height)] = moving
+        self._rehash(height + 1, path)
+
+    def prove(self, key):
+        """key的证明（存在与不存在相同）：(高度, bitmap, siblings, 其他叶子)。
+        沿key的路径遇到的第一个叶子或空子树位于该高度；bitmap第h位为1表示高度h的兄弟非空，
+        siblings自底向上只包含非空兄弟；该位置是另一个键的叶子时给出其 (键摘要, 值摘要)，否则为None"""
+        key_digest = sparse_key_digest(key)
+        path = self.key_path(key_digest)
+        height = self._descend(path)
+        leaf = self.leaves.get((height, path >> height))
+        other = None
+        if leaf is not None and leaf[0] != key_digest:
+            other = leaf[0], sm3_digest(leaf[1])
+        bitmap = 0
+        siblings = []
+        for h in range(height, self.depth):
+            sibling = self._subtree(h, (path >> h) ^ 1)
+            if sibling != EMPTY_SUBTREE:
+                bitmap |= 1 << h
+                siblings.append(sibling)
+        return height, bitmap, siblings, other
+
+
+EMPTY_SUBTREE = bytes(DIGEST_SIZE)  # 稀疏树中空子树的哈希
+
+
+def sparse_key_digest(key):
+    return sm3_digest(key.encode() if isinstance(key, str) else key)
+
+
+def sparse_leaf_hash(key_digest, value):
+    """稀疏树叶子 H(0x00 || 键摘要 || H(值))；值取摘要，不存在性证明中只需给出其他键的值摘要"""
+    return leaf_hash(key_digest + sm3_digest(value))
+
+
+def verify_sparse_proof(key, value, proof, root, depth=256):
+    """value为None时验证key不存在：路径上是空子树，或是另一个键的叶子"""
+    height, bitmap, siblings, other = proof
+    if not 0 <= height <= depth or bitmap >> depth or bitmap & ((1 << height) - 1):
+        return False
+    key_digest = sparse_key_digest(key)
+    path = int.from_bytes(key_digest, 'big') >> (DIGEST_SIZE * 8 - depth)
+    if value is not None:
+        if other is not None:
+            return False
+        digest = sparse_leaf_hash(key_digest, value.encode() if isinstance(value, str) else value)
+    elif other is None:
+        digest = EMPTY_SUBTREE
+    else:
+        other_key, other_value = other
+        if other_key == key_digest:
+            return False
+        digest = leaf_hash(other_key + other_value)
+    pos = 0
+    for h in range(height, depth):
+        if bitmap >> h & 1:
+            if pos == len(siblings):
+                return False
+            sibling = siblings[pos]
+            pos += 1
+        else:
+            sibling = EMPTY_SUBTREE
+        digest = node_hash(sibling, digest) if path >> h & 1 else node_hash(digest, sibling)
+    return pos == len(siblings) and digest == root
+
+
+def check_sparse_keys(count=41, depth=8):
+    """回归检查：路径较短时不同的键不会互相覆盖，证明绑定键，删除后存储恢复压缩形式"""
+    smt = SparseMerkleTree(depth)
+    stored = {}
+    for i in range(count):
+        try:
+            smt.update(f"k{i}", f"v{i}")
+            stored[f"k{i}"] = f"v{i}".encode()
+        except ValueError:  # 路径冲突，拒绝插入而不是覆盖已有的键
+            pass
+    ok = all(smt.get(k) == v for k, v in stored.items()) and len(smt.leaves) == len(stored)
+    keys = sorted(stored)
+    for k in keys:
+        ok &= verify_sparse_proof(k, stored[k], smt.prove(k), smt.root, depth)
+        ok &= not verify_sparse_proof(keys[0] if k != keys[0] else keys[1], stored[k], smt.prove(k), smt.root, depth)
+    ok &= verify_sparse_proof('absent', None, smt.prove('absent'), smt.root, depth)
+    for k in keys[1:]:
+        smt.delete(k)
+    ok &= len(smt.nodes) == 0 and smt.root == sparse_leaf_hash(sparse_key_digest(keys[0]), stored[keys[0]])
+    print("稀疏树{}个键（depth={}）: 存入{}个，绑定键且不覆盖: {}".format(count, depth, len(stored), ok))
+    return ok
+
+
+def compare_backends(pairs):
+    """各SM3后端用hash_pairs计算pairs个内部节点的吞吐"""
+    buf = bytes(random.getrandbits(8) for _ in range(pairs * 2 * DIGEST_SIZE))
+    results = {}
+    for name, backend_cls in HASH_BACKENDS.items():
+        backend = backend_cls()
+        out = bytearray(pairs * DIGEST_SIZE)
+        t_start = time.perf_counter()
+        backend.hash_pairs(buf, out)
+        elapsed = time.perf_counter() - t_start
+        results[name] = bytes(out)
+        print("{}后端: {:.0f}次哈希/秒".format(name, pairs / elapsed))
+    print("各后端结果一致:", len(set(results.values())) == 1)
+
+
+def check_multi_proof_forgery():
+    """回归检查：在真实证明中混入伪造叶子（重复下标、乱序下标）必须验证失败"""
+    tree = MerkleTree.from_records([str(i) for i in range(16)])
+    indices, nodes = tree.multi_proof([3])
+    real, evil = tree.leaf(3), leaf_hash(b'EVIL')
+    padded = [d for node in nodes for d in (node, bytes(DIGEST_SIZE))]
+    forged = [
+        ([3, 3], [real, evil], padded),
+        ([3, 0], [real, evil], padded),
+    ]
+    rejected = all(not verify_multi_proof(tree.size, i, l, n, tree.root) for i, l, n in forged)
+    try:
+        decode_multi_proof(MULTIPROOF_HEADER.pack(tree.size, 2, len(padded)) + b'\x03\x00'
+                           + b''.join(padded))
+        rejected = False
+    except ValueError:
+        pass
+    print("伪造的重复/乱序下标被拒绝:", rejected)
+    return rejected
+
+
+def random_string_generate(size, allowed_chars):
+    return ''.join(random.choice(allowed_chars) for x in range(size))
+
+
+def compare_build(num):
+    """对比create和build_levels构建num个叶子节点所需时间"""
+    allowed_chars = string.ascii_letters + string.punctuation
+    records = [random_string_generate(5, allowed_chars) for i in range(num)]
+    t_start = time.perf_counter()
+    create(records)
+    t_mid = time.perf_counter()
+    levels = build_levels(records)
+    t_end = time.perf_counter()
+    print("创建{}叶子节点: create {:.3f}s, build_levels {:.3f}s, 高度{}".format(
+        num, t_mid - t_start, t_end - t_mid, len(levels)))
+
+
+if __name__ == "__main__":
+    record_list = [ 'jing', 'dd', 'dddd', 'w', 'aa', 'n', 'ddd', 'e', 'ee', 'qq', 'wfag', 'aaa', 'bb']
+    listt, height, table = create(record_list)
+    print("proof:", listt)
+    #print("所有层级哈希值:",table)
+    print("height:", height)
+
+    '''
+    #十万叶子节点,计时
+    def random_string_generate(size,allowed_chars):
+        return ''.join(random.choice(allowed_chars)for x in range(size))
+
+    allowed_chars=string.ascii_letters+string.punctuation
+
+    record_list=[]
+    num=100000
+    for i in range(num):
+        record_list.append(random_string_generate(5,allowed_chars))
+    print("ok")
+    t_start=time.time()
+    listt,height,table=create(record_list)
+    t_end=time.time()
+    print("height:",height)
+    print("创建{}叶子节点的merkle tree所需时间为{}s".format(num,t_end-t_start))
+
+
+    '''
+
+    '''
+    tx = ('aa')
+    print(tx)
+    pos = record_list.index(tx)
+    tx = sm3.sm3_hash(func.bytes_to_list(tx.encode()))
+    print(tx, pos)
+    if_exist = include_proof(tx, pos, height, table)
+    if if_exist == True:
+        print("该节点存在")
+    else:
+        print("该节点不存在")'''
+
+    pos1=2
+    pos2=4
+    print(pos1,pos2)
+    if_note=exclude_proof(pos1,pos2,table)
+    if if_note==True:
+        print("两端节点相邻，该节点不存在")
+    else:
+        print("该节点存在")
+
+    # RFC 6962审计路径
+    tree = MerkleTree.from_records(record_list)
+    index = record_list.index('aa')
+    path = tree.audit_path(index)
+    print("RFC 6962根哈希:", tree.root.hex())
+    print("'aa'的审计路径验证:", verify_audit_path(tree.leaf(index), index, tree.size, path, tree.root))
+    t_start = time.perf_counter()
+    for i in range(10000):
+        tree.audit_path(i % tree.size)
+    print("生成审计路径平均耗时: {:.2f}us".format((time.perf_counter() - t_start) / 10000 * 1e6))
 
+    # 稀疏Merkle树：存在性与不存在性证明
+    smt = SparseMerkleTree()
+    for r in record_list:
+        smt.update(r, r.upper())
+    t_start = time.perf_counter()
+    proof = smt.prove('aa')
+    t_mid = time.perf_counter()
+    print("稀疏树'aa'存在性证明: {}（非空兄弟{}个，生成{:.1f}ms）".format(
+        verify_sparse_proof('aa', 'AA', proof, smt.root), len(proof[2]), (t_mid - t_start) * 1e3))
+    t_start = time.perf_counter()
+    proof = smt.prove('zz')
+    ok = verify_sparse_proof('zz', None, proof, smt.root)
+    print("稀疏树'zz'不存在性证明: {}（生成并验证{:.1f}ms）".format(ok, (time.perf_counter() - t_start) * 1e3))
+    print("稀疏树存储: {}个键, {}个叶子, {}个内部节点".format(len(record_list), len(smt.leaves), len(smt.nodes)))
+    check_sparse_keys()
 
+    # 合并证明
+    compare_multi_proof(4096, 500)
+    check_multi_proof_forgery()
 
+    # 哈希后端对比
+    compare_backends(2000)
 
-pos1=2
-pos2=4
-print(pos1,pos2)
-if_note=exclude_proof(pos1,pos2,table)
-if if_note==True:
-    print("两端节点相邻，该节点不存在")
-else:
-    print("该节点存在")
+    # 构建方式对比
+    compare_build(5000)
@@ -23,6 +23,8 @@ def add(m, n):
             return 0
         k = ((m[1] - n[1]) * mul_inv(m[0] - n[0], p)) % p
     else:
+        if m[1] % p == 0:  # 切线垂直，倍点为无穷远点
+            return 0
         k = ((3 * (m[0] * m[0]) + a) * mul_inv(2 * m[1], p)) % p
     x = (k * k - m[0] - n[0]) % p
     y = (k * (m[0] - x) - m[1]) % p
@@ -39,6 +41,38 @@ def p_mul_n(n, p):
     return tmp
 
 
+def batch_inv(values, m):
+    """Montgomery批量求逆：一次模逆 + 3(k-1)次乘法，不可逆的元素返回None"""
+    idx = [i for i, x in enumerate(values) if x % m != 0 and math.gcd(x, m) == 1]
+    res = [None] * len(values)
+    if not idx:
+        return res
+    prefix = []
+    acc = 1
+    for i in idx:
+        acc = (acc * values[i]) % m
+        prefix.append(acc)
+    inv = mul_inv(acc, m)
+    for j in range(len(idx) - 1, 0, -1):
+        i = idx[j]
+        res[i] = (inv * prefix[j - 1]) % m
+        inv = (inv * values[i]) % m
+    res[idx[0]] = inv
+    return res
+
+
+def multi_mul(u1, P1, u2, P2):
+    """Shamir交错点乘：同时扫描u1、u2的比特，共用一条倍点链计算u1*P1+u2*P2"""
+    table = [0, P1, P2, add(P1, P2)]
+    R = 0
+    for i in range(max(u1.bit_length(), u2.bit_length()) - 1, -1, -1):
+        R = add(R, R)
+        bits = ((u1 >> i) & 1) | (((u2 >> i) & 1) << 1)
+        if bits:
+            R = add(R, table[bits])
+    return R
+
+
 def ECDSA_sign(m, n, G, d, k):
     R = p_mul_n(k, G)
     r = R[0] % n
@@ -74,6 +108,24 @@ def ver_no_m(e, n, G, r, s, P):
     return success
 
 
+def batch_ver_no_m(sigs, n, G):
+    """批量验签：sigs为[(e, r, s, P), ...]，返回每个签名的验证结果列表"""
+    ws = batch_inv([s for _, _, s, _ in sigs], n)  # 所有w=s^-1只做一次模逆
+    results = []
+    for (e, r, s, P), w in zip(sigs, ws):
+        if w is None or not (0 < r < n):
+            results.append(False)
+            continue
+        w_point = multi_mul((e * w) % n, G, (r * w) % n, P)
+        results.append((w_point != 0) and (w_point[0] % n == r))
+    return results
+
+
+def ECDSA_batch_ver(sigs, n, G):
+    """带消息的批量验签：sigs为[(m, r, s, P), ...]"""
+    return batch_ver_no_m([(hash(m), r, s, P) for m, r, s, P in sigs], n, G)
+
+
 def pretend(n, G, P):  # satoshi无消息签名算法
     u = random.randint(1, n - 1)
     v = random.randint(1, n - 1)
@@ -98,6 +150,7 @@ def pretend(n, G, P):  # satoshi无消息签名算法
     # 验证伪造的签名
     print("伪造签名验证结果:", end=' ')
     ver_no_m(e1, n, G, R, s1, P)
+    return e1, R, s1
 
 
 # 椭圆曲线参数
@@ -111,4 +164,13 @@ P = p_mul_n(d, G)  # 公钥
 
 # 运行伪造攻击
 print("尝试伪造中本聪数字签名:")
-pretend(n, G, P)
\ No newline at end of file
+pretend(n, G, P)
+
+# 批量验证多组伪造签名
+print("\n批量验证伪造签名:")
+forged = []
+for _ in range(5):
+    sig = pretend(n, G, P)
+    if sig is not None:
+        forged.append((sig[0], sig[1], sig[2], P))
+print("批量验证结果:", batch_ver_no_m(forged, n, G))
@@ -1,13 +1,21 @@
+import dbm
+import math
 import random
 import hashlib
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from ecdsa import NIST256p
 from ecdsa.ellipticcurve import PointJacobi
 from phe import paillier  # 加法同态加密库
 
+from ec_batch import batch_scalar_mul  # 固定标量批量点乘
+
 # 初始化椭圆曲线
 curve = NIST256p.curve
 G = NIST256p.generator
 n = NIST256p.order  # 曲线阶数
+field_p, curve_a, curve_b = curve.p(), curve.a(), curve.b()  # y² = x³ + ax + b (mod p)
 
 
 # 点序列化（65字节未压缩格式）
@@ -15,18 +23,58 @@ def serialize_point(point):
     return point.to_bytes(encoding='uncompressed')
 
 
+POINT_SIZE = 33  # 压缩点编码长度
+
+
+# 点的规范字节编码（33字节压缩格式），用作哈希表的键
+def point_key(point):
+    return point.to_bytes(encoding='compressed')
+
+
 # 点反序列化
 def deserialize_point(data):
     return PointJacobi.from_bytes(curve, data)
 
 
-# 哈希函数（字符串 -> 曲线点）
+# 哈希函数（字符串 -> 曲线点），try-and-increment：
+# SHA-512(计数器 || 输入) 的前32字节作为x坐标，若x³+ax+b是二次剩余则开方得到y，
+# 期望约2次尝试；P-256的p ≡ 3 (mod 4)，开方只需一次模幂，远低于一次标量乘
 def hash_to_point(input_str):
-    h = hashlib.sha256(input_str.encode()).digest()
-    h_int = int.from_bytes(h, 'big') % n
-    if h_int == 0:
-        h_int = 1  # 避免0
-    return h_int * G
+    data = input_str.encode()
+    ctr = 0
+    while True:
+        h = hashlib.sha512(ctr.to_bytes(4, 'big') + data).digest()
+        x = int.from_bytes(h[:32], 'big') % field_p
+        y2 = (x * x * x + curve_a * x + curve_b) % field_p
+        y = pow(y2, (field_p + 1) // 4, field_p)
+        if y * y % field_p == y2:
+            if (y & 1) != (h[32] & 1):  # y的奇偶性也由哈希决定
+                y = field_p - y
+            return PointJacobi(curve, x, y, 1)
+        ctr += 1
+
+
+class PointCache:
+    """H(标识符)的持久化缓存（dbm），跨会话复用；值为64字节 x||y，读取时无需开方"""
+
+    def __init__(self, path):
+        self.db = dbm.open(path, 'c')
+
+    def hash_points(self, items):
+        points = []
+        for v in items:
+            key = v.encode()
+            raw = self.db.get(key)
+            if raw is None:
+                point = hash_to_point(v)
+                self.db[key] = point.to_bytes()
+            else:
+                point = PointJacobi.from_bytes(curve, raw)
+            points.append(point)
+        return points
+
+    def close(self):
+        self.db.close()
 
 
 # 洗牌函数
@@ -36,38 +84,243 @@ def shuffle_list(input_list):
     return shuffled
 
 
+# 进程池工作函数：私钥在进程初始化时只发送一次
+_worker_k = None
+
+
+def _init_worker(k):
+    global _worker_k
+    _worker_k = k
+
+
+def hash_exp_chunk(chunk, encode=serialize_point):
+    """子进程：对一块标识符计算H(v)^k，返回encode编码的点（psi_net传入point_key得到压缩编码）"""
+    return [encode(p) for p in batch_scalar_mul(_worker_k, [hash_to_point(v) for v in chunk])]
+
+
+def exp_chunk(chunk, encode=serialize_point):
+    """子进程：对一块点编码（压缩或未压缩）计算p^k，返回encode编码的点"""
+    return [encode(p) for p in batch_scalar_mul(_worker_k, [deserialize_point(b) for b in chunk])]
+
+
+def scalar_pool(k, workers):
+    """工作进程在初始化时收到私钥k的进程池"""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(k,))
+
+
+def parallel_map(func, items, pool, workers, chunk_size=None):
+    """把items分块交给已有的进程池处理，结果保持输入顺序"""
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(len(items) / (workers * 4)))
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    result = []
+    for part in pool.map(func, chunks):
+        result.extend(part)
+    return result
+
+
+def _obfuscator_chunk(args):
+    """计算count个Paillier随机因子r^n mod n²（与value无关，可离线完成）"""
+    n_pub, count = args
+    nsquare = n_pub * n_pub
+    rng = random.SystemRandom()
+    return [pow(rng.randrange(1, n_pub), n_pub, nsquare) for _ in range(count)]
+
+
+class ObfuscatorPool:
+    """Paillier随机因子池：离线预计算r^n mod n²，在线加密只需一次模乘"""
+
+    def __init__(self, public_key, workers=1):
+        self.public_key = public_key
+        self.workers = workers
+        self._pool = deque()
+        self._executor = None  # 进程池，首次使用时创建，close()时关闭
+        self._pending = []  # 后台填充中尚未取回的任务
+
+    def __len__(self):
+        return len(self._pool)
+
+    def executor(self):
+        """计算随机因子的进程池，每个ObfuscatorPool只创建一次，跨批次、跨数据块复用"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=max(1, self.workers))
+        return self._executor
+
+    def _jobs(self, count):
+        per = math.ceil(count / max(1, self.workers))
+        return [(self.public_key.n, min(per, count - i)) for i in range(0, count, per)]
+
+    def fill(self, count):
+        """预计算count个随机因子，workers > 1时跨进程计算"""
+        if count <= 0:
+            return
+        if self.workers <= 1:
+            self._pool.extend(_obfuscator_chunk((self.public_key.n, count)))
+            return
+        for part in self.executor().map(_obfuscator_chunk, self._jobs(count)):
+            self._pool.extend(part)
+
+    def fill_background(self, count):
+        """把填充任务提交到进程池后立即返回（workers <= 1时也用一个工作进程），
+        模幂在子进程中进行，不占用主进程的GIL，能与主进程的点运算重叠；结果在wait()或池耗尽时取回"""
+        self.wait()
+        if count > 0:
+            self._pending = [self.executor().submit(_obfuscator_chunk, job) for job in self._jobs(count)]
+
+    def wait(self):
+        for future in self._pending:
+            self._pool.extend(future.result())
+        self._pending = []
+
+    def close(self):
+        """关闭进程池，丢弃尚未完成的后台填充"""
+        self._pending = []
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def take(self):
+        if not self._pool:
+            self.wait()
+        try:
+            return self._pool.popleft()
+        except IndexError:  # 池已耗尽，现场计算
+            return _obfuscator_chunk((self.public_key.n, 1))[0]
+
+    def encrypt_raw(self, plaintext, exponent=0):
+        """加密已编码的明文整数（0 <= plaintext < n），随机因子取自预计算池"""
+        pub = self.public_key
+        nude = pub.raw_encrypt(plaintext, r_value=1)
+        enc = paillier.EncryptedNumber(pub, nude * self.take() % pub.nsquare, exponent)
+        enc._EncryptedNumber__is_obfuscated = True  # 已乘随机因子，避免ciphertext()再次混淆
+        return enc
+
+    def encrypt(self, value):
+        """与phe的encrypt等价，但随机因子取自预计算池"""
+        encoding = paillier.EncodedNumber.encode(self.public_key, value)
+        return self.encrypt_raw(encoding.encoding, encoding.exponent)
+
+    def rerandomize(self, ciphertext):
+        """给已有密文乘上新的随机因子，明文不变但密文与之前不可关联"""
+        pub = self.public_key
+        enc = paillier.EncryptedNumber(pub, ciphertext * self.take() % pub.nsquare)
+        enc._EncryptedNumber__is_obfuscated = True
+        return enc
+
+    def encrypt_values(self, values, raw=False):
+        """批量加密一列值，池中不足的随机因子先并行补齐；raw为True时values是已编码的明文整数"""
+        self.wait()
+        self.fill(len(values) - len(self._pool))
+        encrypt = self.encrypt_raw if raw else self.encrypt
+        return [encrypt(v) for v in values]
+
+
+class SlotPacker:
+    """把多列有界非负整数打包进同一个Paillier明文。
+    每个槽 value_bits + headroom 位，headroom按最多累加count个元素计算，保证求和不会进位到相邻槽"""
+
+    def __init__(self, public_key, columns, value_bits, count):
+        self.columns = columns
+        self.value_bits = value_bits
+        self.slot_bits = value_bits + max(1, count).bit_length()
+        self.slots = (public_key.n.bit_length() - 1) // self.slot_bits  # 打包后的明文必须小于n
+        if self.slots < 1:
+            raise ValueError("单个槽超出Paillier明文空间")
+        self.groups = math.ceil(columns / self.slots)  # 每个元素需要的密文个数
+
+    def pack(self, values):
+        if len(values) != self.columns:
+            raise ValueError(f"期望{self.columns}列，实际{len(values)}列")
+        plaintexts = []
+        for g in range(0, self.columns, self.slots):
+            acc = 0
+            for v in reversed(values[g:g + self.slots]):
+                if not 0 <= v < (1 << self.value_bits):
+                    raise ValueError(f"值{v}超出打包范围")
+                acc = (acc << self.slot_bits) | v
+            plaintexts.append(acc)
+        return plaintexts
+
+    def unpack(self, plaintexts):
+        mask = (1 << self.slot_bits) - 1
+        sums = []
+        for g, pt in zip(range(0, self.columns, self.slots), plaintexts):
+            for _ in range(min(self.slots, self.columns - g)):
+                sums.append(pt & mask)
+                pt >>= self.slot_bits
+        return sums
+
+
 class DDHPrivateIntersectionSum:
-    def __init__(self, p1_data, p2_data):
+    def __init__(self, p1_data, p2_data, workers=1, h2c_cache=None, packing=False, cardinality_only=False,
+                 k2=None, paillier_keys=None):
         self.p1_data = p1_data  # P1的集合 [str]
-        self.p2_data = p2_data  # P2的集合 [(str, int)]
+        self.p2_data = p2_data  # P2的集合 [(str, int)] 或多列 [(str, (int, ...))]，只求交集大小时也可为 [str]
+        self.packing = packing  # 多列值是否打包进同一个Paillier明文
+        self.cardinality_only = cardinality_only  # 只计算交集大小，跳过所有Paillier运算
+        self.packer = None
+        self.packed_scalars = False  # 打包模式下P2的值是否为单列标量，是则解包后还原为单个整数
+        self.workers = workers  # 哈希和指数运算使用的进程数，1为单进程
+        self.pools = {}  # 私钥 -> 进程池，首次使用时创建，close()时关闭
+        self.h2c_cache = PointCache(h2c_cache) if h2c_cache else None  # H(标识符)持久化缓存路径
 
         # 生成密钥
         self.k1 = random.randint(1, n - 1)  # P1私钥
-        self.k2 = random.randint(1, n - 1)  # P2私钥
-        self.paillier_pub, self.paillier_priv = paillier.generate_paillier_keypair(n_length=768)  # Paillier密钥
+        self.k2 = k2 or random.randint(1, n - 1)  # P2私钥，可沿用已有密钥周期的k2
+        if cardinality_only:
+            self.paillier_pub = self.paillier_priv = self.obfuscators = None
+        else:
+            # Paillier密钥，可沿用已有密钥周期的密钥对
+            self.paillier_pub, self.paillier_priv = paillier_keys or paillier.generate_paillier_keypair(n_length=768)
+            self.obfuscators = ObfuscatorPool(self.paillier_pub, workers)  # Paillier随机因子池
+
+    def pool(self, k):
+        """私钥k对应的进程池，每个私钥只创建一次，跨轮次、跨数据块复用"""
+        if k not in self.pools:
+            self.pools[k] = scalar_pool(k, self.workers)
+        return self.pools[k]
+
+    def hash_exp(self, k, items):
+        """计算每个标识符的H(v)^k，workers > 1时分块并行"""
+        if self.h2c_cache is not None:
+            return self.exp_points(k, self.h2c_cache.hash_points(items))
+        if self.workers <= 1:
+            return batch_scalar_mul(k, [hash_to_point(v) for v in items])
+        return [deserialize_point(b) for b in parallel_map(hash_exp_chunk, items, self.pool(k), self.workers)]
+
+    def exp_points(self, k, points):
+        """计算每个点的p^k，workers > 1时分块并行"""
+        if self.workers <= 1:
+            return batch_scalar_mul(k, points)
+        data = [serialize_point(p) for p in points]
+        return [deserialize_point(b) for b in parallel_map(exp_chunk, data, self.pool(k), self.workers)]
+
+    def close(self):
+        """关闭进程池和H(标识符)缓存"""
+        for pool in self.pools.values():
+            pool.shutdown()
+        self.pools.clear()
+        if self.obfuscators is not None:
+            self.obfuscators.close()
+        if self.h2c_cache is not None:
+            self.h2c_cache.close()
+            self.h2c_cache = None
 
     def round1_p1(self):
         """P1: 计算H(v_i)^k1并发送"""
-        self.p1_processed = []
-        for v in self.p1_data:
-            point = hash_to_point(v)
-            exp_point = self.k1 * point  # g^{k1}
-            self.p1_processed.append(exp_point)
+        self.p1_processed = self.hash_exp(self.k1, self.p1_data)  # g^{k1}
         return shuffle_list(self.p1_processed)
 
     def round2_p2(self, p1_points):
         # 1. 双加密P1的点
-        dual_enc_points = [self.k2 * p for p in p1_points]
+        dual_enc_points = self.exp_points(self.k2, p1_points)
 
         # 2. 准备P2的数据（保持点和值的对应关系）
-        self.p2_enc_points = []
-        self.p2_enc_values = []
-        for w, t_val in self.p2_data:
-            point = hash_to_point(w)
-            exp_point = self.k2 * point
-            enc_t = self.paillier_pub.encrypt(t_val)
-            self.p2_enc_points.append(exp_point)
-            self.p2_enc_values.append(enc_t)
+        if self.cardinality_only:
+            self.p2_enc_points = self.hash_exp(self.k2, [w if isinstance(w, str) else w[0] for w in self.p2_data])
+            return shuffle_list(dual_enc_points), shuffle_list(self.p2_enc_points), None
+        self.p2_enc_points = self.hash_exp(self.k2, [w for w, _ in self.p2_data])
+        self.p2_enc_values = self.encrypt_rows([t_val for _, t_val in self.p2_data])
 
         # 3. 一起洗牌点和值（保持对应关系）
         combined = list(zip(self.p2_enc_points, self.p2_enc_values))
@@ -78,24 +331,59 @@ class DDHPrivateIntersectionSum:
 
     def round3_p1(self, dual_enc_points, p2_points, p2_enc_values):
         """P1: 计算交集和同态和"""
-        # 计算交集
-        valid_indices = []
-        for i, p2_point in enumerate(p2_points):
-            dual_p2_point = self.k1 * p2_point  # 双加密点
-            if dual_p2_point in dual_enc_points:
-                valid_indices.append(i)
-
-        # 同态求和（交集内的值）
-        sum_ciphertext = self.paillier_pub.encrypt(0)
-        for idx in valid_indices:
-            sum_ciphertext += p2_enc_values[idx]
+        # 计算交集：双加密点转为规范字节编码放入哈希集合，O(n + m)
+        dual_keys = {point_key(p) for p in dual_enc_points}
+        dual_p2_points = self.exp_points(self.k1, p2_points)  # 双加密点
+        valid_indices = [i for i, p in enumerate(dual_p2_points) if point_key(p) in dual_keys]
 
         self.intersection_size = len(valid_indices)
-        return sum_ciphertext
+        return self.sum_values(p2_enc_values, valid_indices)
+
+    def encrypt_rows(self, rows):
+        """加密P2的值：单列时每个元素一个密文；多列时每个元素一组密文，打包模式下一组覆盖多列"""
+        if not rows or not isinstance(rows[0], (tuple, list)):
+            if self.packing:
+                rows = [(t,) for t in rows]
+                self.packed_scalars = True
+            else:
+                return self.obfuscators.encrypt_values(rows)
+        if self.packing:
+            value_bits = max(1, max(max(r) for r in rows).bit_length()) if rows else 1
+            self.packer = SlotPacker(self.paillier_pub, len(rows[0]) if rows else 1, value_bits, len(rows))
+            flat = self.obfuscators.encrypt_values([pt for r in rows for pt in self.packer.pack(r)], raw=True)
+            size = self.packer.groups
+        else:
+            flat = self.obfuscators.encrypt_values([t for r in rows for t in r])
+            size = len(rows[0])
+        return [tuple(flat[i:i + size]) for i in range(0, len(flat), size)]
+
+    def sum_values(self, p2_enc_values, valid_indices):
+        """同态求和（交集内的值）；多列时逐组相加，打包模式下一次加法同时累加一组内的所有列"""
+        if self.cardinality_only:
+            return None
+        if not p2_enc_values or not isinstance(p2_enc_values[0], tuple):
+            sum_ciphertext = self.obfuscators.encrypt(0)
+            for idx in valid_indices:
+                sum_ciphertext += p2_enc_values[idx]
+            return sum_ciphertext
+        sums = [self.obfuscators.encrypt_raw(0) for _ in p2_enc_values[0]]
+        for idx in valid_indices:
+            sums = [a + b for a, b in zip(sums, p2_enc_values[idx])]
+        return sums
 
     def final_output_p2(self, sum_ciphertext):
-        """P2: 解密获得总和"""
-        intersection_sum = self.paillier_priv.decrypt(sum_ciphertext)
+        """P2: 解密获得总和（多列时为每列的总和列表，单列时即使打包也是整数，只求交集大小时为None）"""
+        if self.cardinality_only:
+            intersection_sum = None
+        elif not isinstance(sum_ciphertext, list):
+            intersection_sum = self.paillier_priv.decrypt(sum_ciphertext)
+        elif self.packing:
+            intersection_sum = self.packer.unpack(
+                [self.paillier_priv.raw_decrypt(c.ciphertext(False)) for c in sum_ciphertext])
+            if self.packed_scalars:
+                intersection_sum = intersection_sum[0]
+        else:
+            intersection_sum = [self.paillier_priv.decrypt(c) for c in sum_ciphertext]
         return self.intersection_size, intersection_sum
 
 
@@ -107,17 +395,28 @@ if __name__ == "__main__":
 
     protocol = DDHPrivateIntersectionSum(p1_set, p2_set)
 
+    # P2离线预计算Paillier随机因子（不计入在线耗时）
+    protocol.obfuscators.fill(len(p2_set) + 1)
+
     # Round 1: P1发送数据
+    t0 = time.perf_counter()
     p1_to_p2 = protocol.round1_p1()
+    t1 = time.perf_counter()
 
     # Round 2: P2发送两组数据
     dual_points, p2_points, p2_enc_values = protocol.round2_p2(p1_to_p2)
+    t2 = time.perf_counter()
 
     # Round 3: P1计算并返回加密和
     sum_ciphertext = protocol.round3_p1(dual_points, p2_points, p2_enc_values)
+    t3 = time.perf_counter()
 
     # P2解密结果
     intersection_size, intersection_sum = protocol.final_output_p2(sum_ciphertext)
+    t4 = time.perf_counter()
+    protocol.close()
 
+    print(f"各轮耗时: round1={t1 - t0:.4f}s round2={t2 - t1:.4f}s "
+          f"round3={t3 - t2:.4f}s final={t4 - t3:.4f}s")
     print(f"交集大小: {intersection_size}")  # 应输出3 (id2,id3,id5)
     print(f"交集值总和: {intersection_sum}")  # 应输出70 (10+20+40)
\ No newline at end of file
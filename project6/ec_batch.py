@@ -0,0 +1,155 @@
+import random
+import time
+
+from ecdsa import NIST256p
+from ecdsa.ellipticcurve import INFINITY, PointJacobi
+
+# P-256 参数，y² = x³ - 3x + b (mod p)
+curve = NIST256p.curve
+n = NIST256p.order
+p = curve.p()
+
+
+def wnaf(k, w):
+    """宽度w的NAF重编码，返回从低位到高位的数字，非零数字为奇数且 |d| < 2^(w-1)"""
+    digits = []
+    mod = 1 << w
+    while k:
+        if k & 1:
+            d = k % mod
+            if d >= mod >> 1:
+                d -= mod
+            k -= d
+        else:
+            d = 0
+        digits.append(d)
+        k >>= 1
+    return digits
+
+
+def batch_inv(values):
+    """Montgomery批量求逆：一次模逆 + 3(k-1)次乘法，values中不能有0"""
+    prefix = []
+    acc = 1
+    for v in values:
+        acc = acc * v % p
+        prefix.append(acc)
+    inv = pow(acc, -1, p)
+    res = [0] * len(values)
+    for i in range(len(values) - 1, 0, -1):
+        res[i] = inv * prefix[i - 1] % p
+        inv = inv * values[i] % p
+    if values:
+        res[0] = inv
+    return res
+
+
+def to_affine(jacobians):
+    """把一批Jacobian点 (X, Y, Z) 用一次批量求逆转成仿射坐标，无穷远点(Z=0)返回None"""
+    zs = [z for _, _, z in jacobians if z]
+    invs = iter(batch_inv(zs))
+    out = []
+    for x, y, z in jacobians:
+        if not z:
+            out.append(None)
+            continue
+        zi = next(invs)
+        zi2 = zi * zi % p
+        out.append((x * zi2 % p, y * zi2 * zi % p))
+    return out
+
+
+def double(x1, y1, z1):
+    """Jacobian倍点（a = -3，dbl-2001-b）"""
+    if not z1 or not y1:
+        return 0, 1, 0
+    delta = z1 * z1 % p
+    gamma = y1 * y1 % p
+    beta = x1 * gamma % p
+    alpha = 3 * (x1 - delta) * (x1 + delta) % p
+    x3 = (alpha * alpha - 8 * beta) % p
+    z3 = ((y1 + z1) * (y1 + z1) - gamma - delta) % p
+    y3 = (alpha * (4 * beta - x3) - 8 * gamma * gamma) % p
+    return x3, y3, z3
+
+
+def add_affine(x1, y1, z1, x2, y2):
+    """Jacobian点加仿射点（madd-2007-bl）"""
+    if not z1:
+        return x2, y2, 1
+    z1z1 = z1 * z1 % p
+    u2 = x2 * z1z1 % p
+    s2 = y2 * z1 * z1z1 % p
+    h = (u2 - x1) % p
+    r = 2 * (s2 - y1) % p
+    if not h:
+        if not r:
+            return double(x2, y2, 1)
+        return 0, 1, 0
+    hh = h * h % p
+    i = 4 * hh
+    j = h * i % p
+    v = x1 * i % p
+    x3 = (r * r - j - 2 * v) % p
+    y3 = (r * (v - x3) - 2 * y1 * j) % p
+    z3 = ((z1 + h) * (z1 + h) - z1z1 - hh) % p
+    return x3, y3, z3
+
+
+def batch_scalar_mul(k, points, w=5):
+    """固定标量、可变基点的批量点乘：标量只做一次wNAF重编码，所有点沿同一加法链前进，
+    预计算表和结果各用一次Montgomery批量求逆转成仿射坐标。返回PointJacobi列表（z = 1）"""
+    k %= n
+    if not k or not points:
+        return [INFINITY] * len(points)
+    digits = wnaf(k, w)
+    size = 1 << (w - 2)  # 每个点的奇数倍表 P, 3P, ..., (2^(w-1)-1)P
+
+    live = [i for i, pt in enumerate(points) if pt != INFINITY]
+    base = [points[i].to_affine() for i in live]
+    base = [(pt.x(), pt.y()) for pt in base]
+
+    # 预计算：先批量得到仿射的2P，再用混合加法生成奇数倍，最后整体批量归一化
+    twice = to_affine([double(x, y, 1) for x, y in base])
+    tables = []
+    for (x, y), t in zip(base, twice):
+        row = [(x, y, 1)]
+        for _ in range(size - 1):
+            row.append(add_affine(*row[-1], *t))
+        tables.append(row)
+    flat = to_affine([q for row in tables for q in row])
+    tables = [flat[i * size:(i + 1) * size] for i in range(len(base))]
+
+    # 主循环：所有点共用同一串wNAF数字
+    accs = [(0, 1, 0)] * len(base)
+    for d in reversed(digits):
+        accs = [double(*acc) for acc in accs]
+        if d:
+            idx = abs(d) >> 1
+            if d > 0:
+                accs = [add_affine(*acc, *table[idx]) for acc, table in zip(accs, tables)]
+            else:
+                accs = [add_affine(*acc, table[idx][0], p - table[idx][1]) for acc, table in zip(accs, tables)]
+
+    out = [INFINITY] * len(points)
+    for i, xy in zip(live, to_affine(accs)):
+        if xy is not None:
+            out[i] = PointJacobi(curve, xy[0], xy[1], 1)
+    return out
+
+
+# 测试示例
+if __name__ == "__main__":
+    G = NIST256p.generator
+    pts = [PointJacobi.from_affine(random.randint(1, n - 1) * G) for _ in range(200)]
+    k = random.randint(1, n - 1)
+
+    t0 = time.perf_counter()
+    ref = [k * pt for pt in pts]
+    ref = [pt.to_bytes('compressed') for pt in ref]  # 逐点归一化
+    t1 = time.perf_counter()
+    res = [pt.to_bytes('compressed') for pt in batch_scalar_mul(k, pts)]
+    t2 = time.perf_counter()
+
+    print("结果一致:", ref == res)
+    print(f"逐点标量乘: {t1 - t0:.3f}s, 批量标量乘: {t2 - t1:.3f}s")
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from phe import paillier
+
+from DDH import DDHPrivateIntersectionSum, ObfuscatorPool
+from psi_filter import FilterDDHPrivateIntersectionSum, current_rss_kb
+from psi_wire import encode_round1, encode_round2, encode_round3
+
+MODES = {
+    'memory': DDHPrivateIntersectionSum,
+    'filter': FilterDDHPrivateIntersectionSum,
+}
+
+
+def make_sets(size, overlap, columns=1, seed=0):
+    """生成两方数据：P1为size个标识符，P2中有overlap比例与P1重合；columns > 1时每个元素有多列值"""
+    rng = random.Random(seed)
+    common = int(size * overlap)
+
+    def value():
+        if columns == 1:
+            return rng.randint(1, 1000)
+        return tuple(rng.randint(1, 1000) for _ in range(columns))
+    p1 = [f"user{i}" for i in range(size)]
+    p2 = [(f"user{i}", value()) for i in range(common)]
+    p2 += [(f"other{i}", value()) for i in range(size - common)]
+    rng.shuffle(p2)
+    matched = [t for w, t in p2 if w.startswith('user')]
+    expected_sum = sum(matched) if columns == 1 else [sum(col) for col in zip(*matched)]
+    return p1, p2, common, expected_sum
+
+
+@contextmanager
+def count_paillier_ops(counts):
+    """临时包装Paillier的加密、同态加法和解密，统计调用次数"""
+    originals = {
+        'encrypt': (ObfuscatorPool, 'encrypt_raw'),
+        'add': (paillier.EncryptedNumber, '__add__'),
+        'decrypt': (paillier.PaillierPrivateKey, 'raw_decrypt'),
+    }
+    saved = {}
+    for name, (cls, attr) in originals.items():
+        func = getattr(cls, attr)
+        saved[name] = func
+
+        def wrapper(*args, _func=func, _name=name, **kwargs):
+            counts[_name] += 1
+            return _func(*args, **kwargs)
+        setattr(cls, attr, wrapper)
+    try:
+        yield counts
+    finally:
+        for name, (cls, attr) in originals.items():
+            setattr(cls, attr, saved[name])
+
+
+def children_cpu_s():
+    """本进程所有子进程的累计CPU时间（秒）。RUSAGE_CHILDREN只包含已回收的子进程，
+    协议对象的进程池要到close()才退出，所以仍在运行的子进程从/proc/<pid>/stat读取utime和stime"""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)  # 先取已回收部分，之后才被回收的进程不会重复计入
+    total = usage.ru_utime + usage.ru_stime
+    try:
+        entries = os.listdir('/proc')
+        ticks = os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, AttributeError):  # 没有/proc时只能统计已回收的子进程
+        return total
+    pid = os.getpid()
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()  # 进程名可能含空格，从最后一个')'之后解析
+        except OSError:
+            continue
+        if int(fields[1]) == pid:  # 字段依次为 状态 父进程号 ... utime(第12个) stime(第13个)
+            total += (int(fields[11]) + int(fields[12])) / ticks
+    return total
+
+
+class RSSSampler:
+    """后台线程每interval秒采样一次当前RSS，记录采样期间的最大值"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = current_rss_kb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_kb())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_kb())
+
+
+class RoundTimer:
+    """记录每轮的墙钟时间、本进程CPU时间、子进程CPU时间（含仍在运行的进程池工作进程），
+    以及本进程在该轮内的RSS：开始、结束时的RSS和采样得到的峰值（采样间隔内的短暂尖峰可能漏掉；不含工作进程）"""
+
+    def __init__(self):
+        self.rounds = {}
+
+    @contextmanager
+    def round(self, name):
+        children = children_cpu_s()
+        rss_start = current_rss_kb()
+        w0, c0 = time.perf_counter(), time.process_time()
+        with RSSSampler() as sampler:
+            yield
+        w1, c1 = time.perf_counter(), time.process_time()
+        self.rounds[name] = {
+            'wall_s': w1 - w0,
+            'cpu_s': c1 - c0,
+            'child_cpu_s': children_cpu_s() - children,
+            'rss_start_kb': rss_start,
+            'rss_end_kb': current_rss_kb(),
+            'sampled_peak_rss_kb': sampler.peak,
+        }
+
+
+def run_once(size, overlap, workers=1, mode='memory', precompute=False, columns=1, packing=False,
+             cardinality_only=False, seed=0):
+    """端到端运行一次协议，返回各轮指标"""
+    p1, p2, common, expected_sum = make_sets(size, overlap, columns, seed)
+    timer = RoundTimer()
+    counts = {'encrypt': 0, 'add': 0, 'decrypt': 0}
+
+    with timer.round('setup'):
+        protocol = MODES[mode](p1, p2, workers=workers, packing=packing, cardinality_only=cardinality_only)
+        if precompute and not cardinality_only:  # P2离线预计算Paillier随机因子
+            protocol.obfuscators.fill((len(p2) + 1) * columns)
+    with count_paillier_ops(counts):
+        with timer.round('round1'):
+            msg1 = protocol.round1_p1()
+        with timer.round('round2'):
+            msg2 = protocol.round2_p2(msg1)
+        with timer.round('round3'):
+            msg3 = protocol.round3_p1(*msg2)
+        with timer.round('final'):
+            intersection_size, intersection_sum = protocol.final_output_p2(msg3)
+
+    # 消息大小按psi_wire的二进制格式计算，不计入各轮耗时
+    pub = protocol.paillier_pub
+    timer.rounds['round1']['message_bytes'] = len(encode_round1(msg1))
+    timer.rounds['round2']['message_bytes'] = len(encode_round2(*msg2, pub))
+    timer.rounds['round3']['message_bytes'] = len(encode_round3(msg3, pub))
+    protocol.close()
+
+    return {
+        'size': size,
+        'overlap': overlap,
+        'workers': workers,
+        'mode': mode,
+        'precompute': precompute,
+        'columns': columns,
+        'packing': packing,
+        'intersection_size': intersection_size,
+        'cardinality_only': cardinality_only,
+        'correct': intersection_size == common and (cardinality_only or intersection_sum == expected_sum),
+        'paillier_ops': counts,
+        'rounds': timer.rounds,
+        'total_wall_s': sum(r['wall_s'] for r in timer.rounds.values()),
+        'process_peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,  # 本次运行进程的历史峰值
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DDH PSI-sum 规模测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--overlap', type=float, default=0.5, help="P2中与P1重合的比例")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--mode', choices=sorted(MODES), default='memory')
+    parser.add_argument('--precompute', action='store_true', help="在setup阶段预计算Paillier随机因子")
+    parser.add_argument('--columns', type=int, default=1, help="P2每个元素的值列数")
+    parser.add_argument('--packing', action='store_true', help="多列值打包进同一个Paillier明文")
+    parser.add_argument('--cardinality-only', action='store_true', help="只计算交集大小，不做Paillier运算")
+    parser.add_argument('--output', default='psi_bench.json')
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes:
+        # 每个规模在新进程中运行，内存指标不受之前规模的影响
+        with ProcessPoolExecutor(1) as pool:
+            res = pool.submit(run_once, size, args.overlap, args.workers, args.mode, args.precompute, args.columns,
+                              args.packing, args.cardinality_only).result()
+        results.append(res)
+        print(f"n={size}: 总耗时{res['total_wall_s']:.2f}s, " + ", ".join(
+            f"{name}={r['wall_s']:.2f}s" for name, r in res['rounds'].items()) + f", 正确={res['correct']}")
+
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import dbm
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from phe import paillier
+
+from DDH import DDHPrivateIntersectionSum, deserialize_point, n, serialize_point
+from psi_stream import batched
+from psi_wire import ciphertext_size
+
+POINT_BYTES = 65  # 存储中使用未压缩编码，读取时无需开方
+DIGEST_BYTES = 16  # 值的摘要，用于判断某行是否变化
+
+
+def value_digest(t_val):
+    return hashlib.sha256(str(t_val).encode()).digest()[:DIGEST_BYTES]
+
+
+class EpochStore:
+    """P2的密钥周期存储：同一周期内固定k2和Paillier密钥，持久化每行的 H(w)^k2 和 Enc(t)
+
+    meta.json 保存k2和Paillier私钥，必须和其他私钥一样妥善保护；
+    同一周期内H(w)^k2在各会话间不变，P1能据此关联不同会话中的同一元素，需要定期调用rotate()换周期
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.meta = json.load(f)
+        else:
+            self._new_epoch(0)
+        self.db = dbm.open(os.path.join(path, 'rows'), 'c')
+
+    def _new_epoch(self, epoch):
+        pub, priv = paillier.generate_paillier_keypair(n_length=768)
+        self.meta = {'epoch': epoch, 'k2': random.randint(1, n - 1), 'p': priv.p, 'q': priv.q}
+        # 含私钥，只允许所有者读写；先写临时文件再替换，旧文件的宽松权限不会保留
+        tmp_path = self.meta_path + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    @property
+    def k2(self):
+        return self.meta['k2']
+
+    @property
+    def paillier_keys(self):
+        pub = paillier.PaillierPublicKey(self.meta['p'] * self.meta['q'])
+        return pub, paillier.PaillierPrivateKey(pub, self.meta['p'], self.meta['q'])
+
+    def rotate(self):
+        """开始新的密钥周期：换k2和Paillier密钥，清空所有预计算行"""
+        self.db.close()
+        for name in os.listdir(self.path):
+            if name.startswith('rows'):
+                os.remove(os.path.join(self.path, name))
+        self._new_epoch(self.meta['epoch'] + 1)
+        self.db = dbm.open(os.path.join(self.path, 'rows'), 'c')
+
+    def get(self, w):
+        return self.db.get(w.encode())
+
+    def put(self, w, record):
+        self.db[w.encode()] = record
+
+    def delete(self, w):
+        del self.db[w.encode()]
+
+    def identifiers(self):
+        return [k.decode() for k in self.db.keys()]
+
+    def records(self):
+        for k in self.db.keys():
+            yield self.db[k]
+
+    def __len__(self):
+        return len(self.db)
+
+    def close(self):
+        self.db.close()
+
+
+class EpochDDHPrivateIntersectionSum(DDHPrivateIntersectionSum):
+    """P2沿用密钥周期存储：round2_p2只重算新增或变化的行，其余行直接从存储读出，
+    再做新的洗牌和Paillier重随机化。P2的值只支持单列整数
+
+    限制：round3_p1按下标取用密文，round2_p2因此仍把所有行读成列表后洗牌再返回，
+    内存占用与P2集合大小成正比，并没有把存储流式地送入这一轮"""
+
+    def __init__(self, p1_data, p2_data, store_path, workers=1, h2c_cache=None, chunk_size=4096):
+        self.store = EpochStore(store_path)
+        super().__init__(p1_data, p2_data, workers, h2c_cache, k2=self.store.k2,
+                         paillier_keys=self.store.paillier_keys)
+        self.chunk_size = chunk_size
+        self.ct_size = ciphertext_size(self.paillier_pub)
+        self.epoch_stats = None
+
+    def sync_store(self):
+        """把P2当前数据同步进存储，只对新增或值变化的行做哈希、指数运算和加密"""
+        current = set()
+        changed = []
+        for w, t_val in self.p2_data:
+            current.add(w)
+            rec = self.store.get(w)
+            if rec is None or rec[POINT_BYTES:POINT_BYTES + DIGEST_BYTES] != value_digest(t_val):
+                changed.append((w, t_val))
+        for chunk in batched(changed, self.chunk_size):
+            points = self.hash_exp(self.k2, [w for w, _ in chunk])
+            values = self.obfuscators.encrypt_values([t for _, t in chunk])
+            for (w, t_val), p, c in zip(chunk, points, values):
+                self.store.put(w, serialize_point(p) + value_digest(t_val)
+                               + c.ciphertext(False).to_bytes(self.ct_size, 'big'))
+        removed = [w for w in self.store.identifiers() if w not in current]
+        for w in removed:
+            self.store.delete(w)
+        self.epoch_stats = {
+            'epoch': self.store.meta['epoch'],
+            'rows': len(current),
+            'recomputed': len(changed),
+            'reused': len(current) - len(changed),
+            'removed': len(removed),
+        }
+
+    def round2_p2(self, p1_points):
+        dual_enc_points = self.exp_points(self.k2, p1_points)
+
+        self.sync_store()
+        rows = []
+        for rec in self.store.records():
+            point = deserialize_point(rec[:POINT_BYTES])
+            ct = int.from_bytes(rec[POINT_BYTES + DIGEST_BYTES:], 'big')
+            rows.append((point, self.obfuscators.rerandomize(ct)))  # 每个会话重新随机化密文
+        random.shuffle(rows)
+        self.p2_enc_points = [p for p, _ in rows]
+        self.p2_enc_values = [c for _, c in rows]
+        random.shuffle(dual_enc_points)
+        return dual_enc_points, self.p2_enc_points, self.p2_enc_values
+
+    def close(self):
+        self.store.close()
+        super().close()
+
+
+# 测试示例
+if __name__ == "__main__":
+    store_dir = tempfile.mkdtemp(prefix='psi_epoch_')
+    p1_set = [f"id{i}" for i in range(100)]
+    p2_set = [(f"id{i}", i) for i in range(50, 150)]
+
+    # 第1次会话：全部计算；第2次会话：改动少量行后只重算这些行
+    for day in range(2):
+        protocol = EpochDDHPrivateIntersectionSum(p1_set, p2_set, store_dir)
+        protocol.obfuscators.fill(len(p2_set) + 1)  # 离线预计算随机因子
+        t0 = time.perf_counter()
+        dual_points, p2_points, p2_enc_values = protocol.round2_p2(protocol.round1_p1())
+        t1 = time.perf_counter()
+        sum_ciphertext = protocol.round3_p1(dual_points, p2_points, p2_enc_values)
+        intersection_size, intersection_sum = protocol.final_output_p2(sum_ciphertext)
+        protocol.close()
+        expected = sum(t for w, t in p2_set if w in p1_set)
+        print(f"第{day + 1}次会话: 交集大小{intersection_size}, 总和{intersection_sum}（应为{expected}），"
+              f"round1+round2耗时{t1 - t0:.2f}s, {protocol.epoch_stats}")
+        p2_set = p2_set[:95] + [(f"new{i}", 1) for i in range(5)]
+        p2_set[0] = (p2_set[0][0], 1000)
+
+    shutil.rmtree(store_dir)
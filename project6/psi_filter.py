@@ -0,0 +1,183 @@
+import math
+import mmap
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from DDH import POINT_SIZE, DDHPrivateIntersectionSum, deserialize_point, point_key
+from psi_stream import RecordFile, batched
+
+
+def current_rss_kb():
+    """当前常驻内存（Linux读/proc/self/statm），其他平台退回进程历史峰值"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def as_key(p):
+    """点或33字节压缩编码统一为bytes键"""
+    return bytes(p) if isinstance(p, (bytes, bytearray, memoryview)) else point_key(p)
+
+
+class BloomFilter:
+    """Bloom过滤器，按容量和目标误判率确定位数m和哈希个数k"""
+
+    def __init__(self, capacity, fp_rate=1e-3):
+        capacity = max(1, capacity)
+        self.m = max(8, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+    def _indexes(self, key):
+        # 双加密点的x坐标在秘密指数下是伪随机的，直接切成两段作为双重哈希的h1、h2
+        h1 = int.from_bytes(key[1:17], 'big')
+        h2 = int.from_bytes(key[17:33], 'big') | 1
+        return ((h1 + i * h2) % self.m for i in range(self.k))
+
+    def add(self, key):
+        for i in self._indexes(key):
+            self.bits[i >> 3] |= 1 << (i & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[i >> 3] & (1 << (i & 7)) for i in self._indexes(key))
+
+
+class SortedKeyFile:
+    """磁盘上有序的定长键，通过mmap二分查找做精确复核"""
+
+    def __init__(self, records):
+        self.records = records
+        self.fp = open(records.path, 'rb')
+        self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ) if len(records) else b''
+
+    def __contains__(self, key):
+        size = self.records.record_size
+        lo, hi = 0, len(self.records)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cur = self.mm[mid * size:(mid + 1) * size]
+            if cur < key:
+                lo = mid + 1
+            elif cur > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def close(self):
+        if len(self.records):
+            self.mm.close()
+        self.fp.close()
+
+
+class FilterDDHPrivateIntersectionSum(DDHPrivateIntersectionSum):
+    """过滤器匹配模式：round3_p1在内存中只保留双加密点的Bloom过滤器，
+    完整的键按序写到磁盘，仅对过滤器命中的元素做精确复核
+
+    双加密点和P2的点可以是任意可迭代对象（PointJacobi或33字节编码，例如psi_stream.RecordFile），
+    只遍历一次，不要求len()，调用方无需在内存中保留整个列表；P2的密文仍按下标取用"""
+
+    def __init__(self, p1_data, p2_data, workers=1, h2c_cache=None, packing=False, cardinality_only=False,
+                 fp_rate=1e-3, workdir=None, chunk_size=4096, run_records=1 << 16):
+        super().__init__(p1_data, p2_data, workers, h2c_cache, packing, cardinality_only)
+        self.fp_rate = fp_rate
+        self.chunk_size = chunk_size
+        self.run_records = run_records
+        self.workdir = tempfile.mkdtemp(prefix='psi_filter_', dir=workdir)
+        self.filter_stats = None
+
+    def round3_p1(self, dual_enc_points, p2_points, p2_enc_values):
+        """P1: 用Bloom过滤器求交，命中后到磁盘有序键上复核，再同态求和"""
+        rss_start = current_rss_kb()
+        t0 = time.perf_counter()
+        # 先把键流写盘得到元素个数，再按个数确定过滤器大小并从映射中逐条加入
+        unsorted = RecordFile.from_records(os.path.join(self.workdir, 'dual'), POINT_SIZE,
+                                           (as_key(p) for p in dual_enc_points))
+        set_size = len(unsorted)
+        bloom = BloomFilter(set_size, self.fp_rate)
+        for key in unsorted:
+            bloom.add(key)
+        exact = RecordFile.from_records(os.path.join(self.workdir, 'dual.sorted'), POINT_SIZE,
+                                        unsorted.sorted_records(self.workdir, self.run_records))
+        unsorted.remove()
+        index = SortedKeyFile(exact)
+        t1 = time.perf_counter()
+        rss_build = current_rss_kb()
+
+        valid_indices = []
+        hits = 0
+        matched = 0
+        for chunk in batched(p2_points, self.chunk_size):
+            points = [deserialize_point(bytes(p)) if isinstance(p, (bytes, bytearray, memoryview)) else p
+                      for p in chunk]
+            for i, p in enumerate(self.exp_points(self.k1, points), matched):
+                key = point_key(p)
+                if key in bloom:
+                    hits += 1
+                    if key in index:  # 精确复核，排除误判
+                        valid_indices.append(i)
+            matched += len(chunk)
+        index.close()
+        exact.remove()
+        t2 = time.perf_counter()
+
+        sum_ciphertext = self.sum_values(p2_enc_values, valid_indices)
+
+        self.intersection_size = len(valid_indices)
+        self.filter_stats = {
+            'set_size': set_size,
+            'filter_bytes': bloom.nbytes,
+            'bits_per_element': bloom.m / max(1, set_size),
+            'hash_functions': bloom.k,
+            'filter_hits': hits,
+            'false_positives': hits - len(valid_indices),
+            'build_seconds': t1 - t0,
+            'match_per_second': matched / (t2 - t1) if t2 > t1 else 0.0,
+            # 进程内存：各阶段的当前RSS，以及进程历史峰值（包含本轮之前的所有内存）
+            'rss_start_kb': rss_start,
+            'rss_after_build_kb': rss_build,
+            'rss_after_match_kb': current_rss_kb(),
+            'process_peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+        return sum_ciphertext
+
+    def close(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+        super().close()
+
+
+# 测试示例
+if __name__ == "__main__":
+    p1_set = [f"id{i}" for i in range(400)]
+    p2_set = [(f"id{i}", i) for i in range(200, 600)]
+
+    protocol = FilterDDHPrivateIntersectionSum(p1_set, p2_set, fp_rate=0.01)
+    dual_points, p2_points, p2_enc_values = protocol.round2_p2(protocol.round1_p1())
+    exact_bytes = sys.getsizeof({point_key(p) for p in dual_points}) + len(dual_points) * sys.getsizeof(b'0' * 33)
+    # 双加密点以磁盘上的定长记录传入，round3_p1逐条读取，内存中不保留点列表
+    dual_file = RecordFile.from_records(os.path.join(protocol.workdir, 'received'), POINT_SIZE,
+                                        (point_key(p) for p in dual_points))
+    del dual_points
+    sum_ciphertext = protocol.round3_p1(dual_file, p2_points, p2_enc_values)
+    intersection_size, intersection_sum = protocol.final_output_p2(sum_ciphertext)
+    protocol.close()
+
+    print(f"交集大小: {intersection_size}")  # 应输出200
+    print(f"交集值总和: {intersection_sum}")  # 应输出sum(range(200, 400))
+    stats = protocol.filter_stats
+    print(f"过滤器: {stats['filter_bytes']}字节（{stats['bits_per_element']:.1f}位/元素），"
+          f"内存哈希集合约{exact_bytes}字节")
+    print(f"命中{stats['filter_hits']}次，误判{stats['false_positives']}次，"
+          f"匹配吞吐{stats['match_per_second']:.0f}个/秒")
+    print(f"进程RSS: 开始{stats['rss_start_kb']}KB, 过滤器构建后{stats['rss_after_build_kb']}KB, "
+          f"匹配后{stats['rss_after_match_kb']}KB")
@@ -0,0 +1,279 @@
+import asyncio
+import random
+import struct
+import time
+from collections import deque
+from functools import partial
+
+from phe import paillier
+
+from DDH import POINT_SIZE, ObfuscatorPool, exp_chunk, hash_exp_chunk, n, point_key, scalar_pool
+from psi_wire import (DUAL_POINTS, HEADER, P2_CIPHERTEXTS, P2_POINTS, ROUND1_POINTS, SUM_CIPHERTEXT,
+                      ciphertext_size, encode_frame, iter_items)
+
+PUBLIC_KEY = 6  # P2 -> P1: Paillier公钥n
+INTERSECTION_SIZE = 7  # P1 -> P2: 交集大小
+SIZE_FIELD = struct.Struct('>Q')
+
+# 进程池工作函数沿用DDH的实现（私钥在DDH.scalar_pool初始化工作进程时发送），点输出为33字节压缩编码
+_hash_exp_keys = partial(hash_exp_chunk, encode=point_key)
+_exp_keys = partial(exp_chunk, encode=point_key)
+
+
+async def read_frame(reader):
+    """从流中读取一帧，返回 (类型, 条目数, 宽度, 负载)"""
+    kind, count, width = HEADER.unpack(await reader.readexactly(HEADER.size))
+    payload = await reader.readexactly(count * width) if count else b''
+    return kind, count, width, memoryview(payload)
+
+
+def end_frame(kind):
+    """条目数为0的帧表示该类型的数据流结束"""
+    return HEADER.pack(kind, 0, 0)
+
+
+async def pipelined(pool, func, chunks, max_inflight):
+    """按顺序产出每块的计算结果，同时最多有max_inflight块在进程池中计算"""
+    loop = asyncio.get_running_loop()
+    inflight = deque()
+    for chunk in chunks:
+        inflight.append(loop.run_in_executor(pool, func, chunk))
+        if len(inflight) >= max_inflight:
+            yield await inflight.popleft()
+    while inflight:
+        yield await inflight.popleft()
+
+
+def _batches(items, batch_size):
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+
+async def _sender(writer, queue):
+    """唯一的写协程：从有界队列取出帧写入，并用drain处理传输层背压"""
+    while True:
+        data = await queue.get()
+        if data is None:
+            return
+        writer.write(data)
+        await writer.drain()
+
+
+class PSIServer:
+    """P2：持有 (w, t) 集合和Paillier私钥，边接收P1的批次边做双重指数运算"""
+
+    def __init__(self, p2_data, batch_size=1024, workers=1, max_inflight=4):
+        self.p2_data = p2_data
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_inflight = max_inflight
+        self.k2 = random.randint(1, n - 1)
+        self.paillier_pub, self.paillier_priv = paillier.generate_paillier_keypair(n_length=768)
+        self.obfuscators = ObfuscatorPool(self.paillier_pub, workers)
+        self.exp_pool = None  # k2的进程池，首次连接时创建，各连接复用，close()时关闭
+        self.result = None
+
+    def pool(self):
+        if self.exp_pool is None:
+            self.exp_pool = scalar_pool(self.k2, self.workers)
+        return self.exp_pool
+
+    async def _send_own(self, pool, queue):
+        """把P2自己的 (H(w)^k2, Enc(t)) 逐批发出，与接收P1数据并行"""
+        loop = asyncio.get_running_loop()
+        data = self.p2_data[:]
+        random.shuffle(data)  # 预先打乱顺序，逐批发送时不必再整体洗牌
+        size = ciphertext_size(self.paillier_pub)
+        batches = _batches(data, self.batch_size)
+        keys_iter = pipelined(pool, _hash_exp_keys, [[w for w, _ in b] for b in batches], self.max_inflight)
+        i = 0
+        async for keys in keys_iter:
+            values = [t for _, t in batches[i]]
+            i += 1
+            enc = await loop.run_in_executor(None, self.obfuscators.encrypt_values, values)
+            cts = [c.ciphertext(False).to_bytes(size, 'big') for c in enc]
+            # 点帧和密文帧作为一个整体入队，保证两者在流中相邻
+            await queue.put(encode_frame(P2_POINTS, keys, POINT_SIZE) + encode_frame(P2_CIPHERTEXTS, cts, size))
+        await queue.put(end_frame(P2_POINTS))
+
+    async def _recv_round1(self, reader, pool):
+        """接收P1的批次，每批到达就提交k2指数运算"""
+        loop = asyncio.get_running_loop()
+        sem = asyncio.Semaphore(self.max_inflight)  # 计算积压时停止读取，向P1施加背压
+        tasks = []
+
+        async def exp(items):
+            try:
+                return await loop.run_in_executor(pool, _exp_keys, items)
+            finally:
+                sem.release()
+
+        while True:
+            kind, count, width, payload = await read_frame(reader)
+            if kind != ROUND1_POINTS:
+                raise ValueError(f"意外的帧类型: {kind}")
+            if count == 0:
+                break
+            await sem.acquire()
+            tasks.append(asyncio.create_task(exp([bytes(p) for p in iter_items(payload, count, width)])))
+        dual = [k for part in await asyncio.gather(*tasks) for k in part]
+        random.shuffle(dual)
+        return dual
+
+    async def handle(self, reader, writer):
+        queue = asyncio.Queue(maxsize=self.max_inflight)
+        sender = asyncio.create_task(_sender(writer, queue))
+        n_bytes = self.paillier_pub.n.to_bytes((self.paillier_pub.n.bit_length() + 7) // 8, 'big')
+        await queue.put(encode_frame(PUBLIC_KEY, [n_bytes], len(n_bytes)))
+
+        pool = self.pool()
+        own = asyncio.create_task(self._send_own(pool, queue))
+        dual = await self._recv_round1(reader, pool)
+        for batch in _batches(dual, self.batch_size):
+            await queue.put(encode_frame(DUAL_POINTS, batch, POINT_SIZE))
+        await queue.put(end_frame(DUAL_POINTS))
+        await own
+
+        msg = {}
+        for _ in range(2):
+            kind, count, width, payload = await read_frame(reader)
+            msg[kind] = bytes(payload)
+        await queue.put(None)
+        await sender
+        writer.close()
+
+        sum_ciphertext = paillier.EncryptedNumber(self.paillier_pub, int.from_bytes(msg[SUM_CIPHERTEXT], 'big'))
+        intersection_size = SIZE_FIELD.unpack(msg[INTERSECTION_SIZE])[0]
+        self.result = intersection_size, self.paillier_priv.decrypt(sum_ciphertext)
+
+    async def start_tcp(self, host='127.0.0.1', port=0):
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def start_unix(self, path):
+        return await asyncio.start_unix_server(self.handle, path)
+
+    def close(self):
+        """关闭指数运算和随机因子的进程池"""
+        if self.exp_pool is not None:
+            self.exp_pool.shutdown()
+            self.exp_pool = None
+        self.obfuscators.close()
+
+
+class PSIClient:
+    """P1：持有集合V，边发送边接收P2的数据并做k1指数运算"""
+
+    def __init__(self, p1_data, batch_size=1024, workers=1, max_inflight=4):
+        self.p1_data = p1_data
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_inflight = max_inflight
+        self.k1 = random.randint(1, n - 1)
+        self.exp_pool = None  # k1的进程池，首次运行时创建，多次运行复用，close()时关闭
+
+    def pool(self):
+        if self.exp_pool is None:
+            self.exp_pool = scalar_pool(self.k1, self.workers)
+        return self.exp_pool
+
+    def close(self):
+        if self.exp_pool is not None:
+            self.exp_pool.shutdown()
+            self.exp_pool = None
+
+    async def _send_round1(self, pool, writer):
+        data = self.p1_data[:]
+        random.shuffle(data)
+        async for keys in pipelined(pool, _hash_exp_keys, _batches(data, self.batch_size), self.max_inflight):
+            writer.write(encode_frame(ROUND1_POINTS, keys, POINT_SIZE))
+            await writer.drain()
+        writer.write(end_frame(ROUND1_POINTS))
+        await writer.drain()
+
+    async def run(self, reader, writer):
+        """执行协议，返回交集大小"""
+        loop = asyncio.get_running_loop()
+        _, _, _, payload = await read_frame(reader)
+        pub = paillier.PaillierPublicKey(int.from_bytes(payload, 'big'))
+
+        dual_keys = set()
+        p2_parts = []  # [(k1指数运算task, 密文列表)]
+        pending_points = None
+        sem = asyncio.Semaphore(self.max_inflight)  # 计算积压时停止读取，向P2施加背压
+
+        async def exp(pool, items):
+            try:
+                return await loop.run_in_executor(pool, _exp_keys, items)
+            finally:
+                sem.release()
+
+        pool = self.pool()
+        sending = asyncio.create_task(self._send_round1(pool, writer))
+        dual_done = p2_done = False
+        while not (dual_done and p2_done):
+            kind, count, width, payload = await read_frame(reader)
+            if kind == DUAL_POINTS:
+                dual_done = count == 0
+                dual_keys.update(bytes(p) for p in iter_items(payload, count, width))
+            elif kind == P2_POINTS:
+                p2_done = count == 0
+                pending_points = [bytes(p) for p in iter_items(payload, count, width)]
+            elif kind == P2_CIPHERTEXTS:
+                # P2数据边到达边做k1指数运算，不等待其余批次；同时最多max_inflight块在计算
+                await sem.acquire()
+                task = asyncio.create_task(exp(pool, pending_points))
+                p2_parts.append((task, [int.from_bytes(c, 'big') for c in iter_items(payload, count, width)]))
+            else:
+                raise ValueError(f"意外的帧类型: {kind}")
+        await sending
+
+        acc = pub.encrypt(0).ciphertext(False)
+        size = 0
+        for task, cts in p2_parts:
+            for key, c in zip(await task, cts):
+                if key in dual_keys:
+                    acc = acc * c % pub.nsquare  # 同态加法
+                    size += 1
+
+        ct_size = ciphertext_size(pub)
+        writer.write(encode_frame(SUM_CIPHERTEXT, [acc.to_bytes(ct_size, 'big')], ct_size))
+        writer.write(encode_frame(INTERSECTION_SIZE, [SIZE_FIELD.pack(size)], SIZE_FIELD.size))
+        await writer.drain()
+        writer.close()
+        self.intersection_size = size
+        return size
+
+    async def connect_tcp(self, host, port):
+        return await self.run(*await asyncio.open_connection(host, port))
+
+    async def connect_unix(self, path):
+        return await self.run(*await asyncio.open_unix_connection(path))
+
+
+# 测试示例
+async def main():
+    p1_set = [f"id{i}" for i in range(400)]
+    p2_set = [(f"id{i}", i) for i in range(200, 600)]
+
+    server = PSIServer(p2_set, batch_size=50)
+    server.obfuscators.fill(len(p2_set))  # P2离线预计算Paillier随机因子
+    client = PSIClient(p1_set, batch_size=50)
+
+    tcp = await server.start_tcp()
+    port = tcp.sockets[0].getsockname()[1]
+    t0 = time.perf_counter()
+    intersection_size = await client.connect_tcp('127.0.0.1', port)
+    while server.result is None:
+        await asyncio.sleep(0.01)
+    t1 = time.perf_counter()
+    tcp.close()
+    await tcp.wait_closed()
+    server.close()
+    client.close()
+
+    print(f"P1得到交集大小: {intersection_size}")  # 应输出200
+    print(f"P2得到 (交集大小, 交集值总和): {server.result}")  # 应输出sum(range(200, 400))
+    print(f"端到端耗时: {t1 - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
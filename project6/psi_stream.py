@@ -0,0 +1,188 @@
+import heapq
+import itertools
+import mmap
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from phe import paillier
+
+from DDH import POINT_SIZE, DDHPrivateIntersectionSum, deserialize_point, point_key
+
+
+def batched(iterable, size):
+    """把任意可迭代对象切成长度为size的块"""
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class RecordFile:
+    """磁盘上的定长记录文件，读取和洗牌都通过mmap完成"""
+
+    def __init__(self, path, record_size):
+        self.path = path
+        self.record_size = record_size
+        self.count = 0
+
+    @classmethod
+    def from_records(cls, path, record_size, records):
+        f = cls(path, record_size)
+        with open(path, 'wb', buffering=1 << 20) as out:
+            for rec in records:
+                out.write(rec)
+                f.count += 1
+        return f
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        if self.count == 0:
+            return
+        size = self.record_size
+        with open(self.path, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for off in range(0, self.count * size, size):
+                yield mm[off:off + size]
+
+    def shuffle(self):
+        """在mmap上原地做Fisher-Yates洗牌，不把记录读入内存"""
+        if self.count < 2:
+            return
+        size = self.record_size
+        with open(self.path, 'r+b') as fp, mmap.mmap(fp.fileno(), 0) as mm:
+            for i in range(self.count - 1, 0, -1):
+                j = random.randint(0, i)
+                if i != j:
+                    a, b = i * size, j * size
+                    tmp = mm[a:a + size]
+                    mm[a:a + size] = mm[b:b + size]
+                    mm[b:b + size] = tmp
+
+    def sorted_records(self, workdir, run_records):
+        """外部排序：每run_records条排序成一个归并段写盘，再多路归并"""
+        runs = []
+        for i, chunk in enumerate(batched(self, run_records)):
+            chunk.sort()
+            path = os.path.join(workdir, f'{os.path.basename(self.path)}.run{i}')
+            runs.append(RecordFile.from_records(path, self.record_size, chunk))
+        try:
+            yield from heapq.merge(*runs)
+        finally:
+            for run in runs:
+                os.remove(run.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class StreamingDDHPrivateIntersectionSum(DDHPrivateIntersectionSum):
+    """流式PSI-sum：各轮输入输出都是定长记录的生成器，中间结果落盘，内存占用只与块大小有关
+
+    记录格式：点为33字节压缩编码；P2的记录为 点 || 定长Paillier密文
+    """
+
+    def __init__(self, p1_data, p2_data, workers=1, workdir=None, chunk_size=4096, run_records=1 << 16,
+                 h2c_cache=None):
+        super().__init__(p1_data, p2_data, workers, h2c_cache)
+        self.chunk_size = chunk_size  # 每次在内存中处理的元素数
+        self.run_records = run_records  # 外部排序每个归并段的记录数
+        self.workdir = tempfile.mkdtemp(prefix='psi_', dir=workdir)
+        self.ct_size = (self.paillier_pub.nsquare.bit_length() + 7) // 8  # 定长密文字节数
+
+    def _file(self, name, record_size, records):
+        return RecordFile.from_records(os.path.join(self.workdir, name), record_size, records)
+
+    def _exp_records(self, k, records):
+        """对点记录流逐块计算p^k，输出压缩编码"""
+        for chunk in batched(records, self.chunk_size):
+            points = self.exp_points(k, [deserialize_point(r) for r in chunk])
+            yield from (point_key(p) for p in points)
+
+    def round1_p1(self):
+        """P1: 流式计算H(v_i)^k1，磁盘洗牌后以生成器发送"""
+        def gen():
+            for chunk in batched(self.p1_data, self.chunk_size):
+                yield from (point_key(p) for p in self.hash_exp(self.k1, chunk))
+        out = self._file('round1', POINT_SIZE, gen())
+        out.shuffle()
+        return iter(out)
+
+    def round2_p2(self, p1_records):
+        """P2: 返回 (双加密点记录流, P2点||密文记录流)，两者都已在磁盘上洗牌"""
+        dual = self._file('round2_dual', POINT_SIZE, self._exp_records(self.k2, p1_records))
+        dual.shuffle()
+
+        def gen():
+            for chunk in batched(self.p2_data, self.chunk_size):
+                points = self.hash_exp(self.k2, [w for w, _ in chunk])
+                values = self.obfuscators.encrypt_values([t for _, t in chunk])
+                for p, c in zip(points, values):
+                    yield point_key(p) + c.ciphertext(False).to_bytes(self.ct_size, 'big')
+        p2 = self._file('round2_p2', POINT_SIZE + self.ct_size, gen())
+        p2.shuffle()
+        return iter(dual), iter(p2)
+
+    def round3_p1(self, dual_records, p2_records):
+        """P1: 两路外部排序后归并求交，同时流式累乘交集内的密文"""
+        dual = self._file('round3_dual', POINT_SIZE, dual_records)
+
+        def gen():
+            for chunk in batched(p2_records, self.chunk_size):
+                keys = self._exp_records(self.k1, [r[:POINT_SIZE] for r in chunk])
+                for key, rec in zip(keys, chunk):
+                    yield key + rec[POINT_SIZE:]
+        p2 = self._file('round3_p2', POINT_SIZE + self.ct_size, gen())
+
+        nsquare = self.paillier_pub.nsquare
+        acc = self.obfuscators.encrypt(0).ciphertext(False)
+        size = 0
+        dual_sorted = dual.sorted_records(self.workdir, self.run_records)
+        cur = next(dual_sorted, None)
+        for rec in p2.sorted_records(self.workdir, self.run_records):
+            key = rec[:POINT_SIZE]
+            while cur is not None and cur < key:
+                cur = next(dual_sorted, None)
+            if cur == key:
+                acc = acc * int.from_bytes(rec[POINT_SIZE:], 'big') % nsquare  # 同态加法
+                size += 1
+        dual_sorted.close()
+        dual.remove()
+        p2.remove()
+
+        self.intersection_size = size
+        return paillier.EncryptedNumber(self.paillier_pub, acc)
+
+    def close(self):
+        """删除工作目录中的所有中间文件"""
+        shutil.rmtree(self.workdir, ignore_errors=True)
+        super().close()
+
+
+# 测试示例
+if __name__ == "__main__":
+    num = 200
+    p1_set = (f"id{i}" for i in range(num))  # 生成器输入，不在内存中保存整个集合
+    p2_set = ((f"id{i}", i) for i in range(num // 2, num + num // 2))
+
+    tracemalloc.start()
+    protocol = StreamingDDHPrivateIntersectionSum(p1_set, p2_set, chunk_size=64, run_records=128)
+    t0 = time.perf_counter()
+    p1_to_p2 = protocol.round1_p1()
+    dual_records, p2_records = protocol.round2_p2(p1_to_p2)
+    sum_ciphertext = protocol.round3_p1(dual_records, p2_records)
+    intersection_size, intersection_sum = protocol.final_output_p2(sum_ciphertext)
+    t1 = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    protocol.close()
+
+    print(f"交集大小: {intersection_size}")  # 应输出num/2
+    print(f"交集值总和: {intersection_sum}")  # 应输出sum(range(num/2, num))
+    print(f"总耗时: {t1 - t0:.2f}s, Python堆峰值: {peak / 1024:.1f}KB")
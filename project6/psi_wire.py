@@ -0,0 +1,159 @@
+import pickle
+import struct
+
+from phe import paillier
+
+from DDH import POINT_SIZE, DDHPrivateIntersectionSum, deserialize_point, point_key
+
+# 帧类型
+ROUND1_POINTS = 1  # P1 -> P2: H(v)^k1
+DUAL_POINTS = 2  # P2 -> P1: H(v)^{k1k2}
+P2_POINTS = 3  # P2 -> P1: H(w)^k2
+P2_CIPHERTEXTS = 4  # P2 -> P1: Enc(t)
+SUM_CIPHERTEXT = 5  # P1 -> P2: 同态和
+
+# 帧头：类型(1字节) | 条目数(4字节) | 条目宽度(2字节)，之后是 条目数*宽度 字节的定长负载
+HEADER = struct.Struct('>BIH')
+DEFAULT_BATCH = 4096
+
+
+def ciphertext_size(public_key):
+    """定长Paillier密文字节数（n²的字节长度）"""
+    return (public_key.nsquare.bit_length() + 7) // 8
+
+
+def encode_frame(kind, items, width):
+    """把一批等长字节串编码成一帧"""
+    payload = b''.join(items)
+    if len(payload) != len(items) * width:
+        raise ValueError("条目长度与帧宽度不一致")
+    return HEADER.pack(kind, len(items), width) + payload
+
+
+def encode_frames(kind, items, width, batch_size=DEFAULT_BATCH):
+    """按batch_size切成多帧，返回拼接后的字节串"""
+    return b''.join(encode_frame(kind, items[i:i + batch_size], width)
+                    for i in range(0, len(items), batch_size))
+
+
+def iter_frames(buf):
+    """逐帧解析，负载以memoryview返回，不复制数据"""
+    view = memoryview(buf)
+    off = 0
+    while off < len(view):
+        kind, count, width = HEADER.unpack_from(view, off)
+        off += HEADER.size
+        end = off + count * width
+        if end > len(view):
+            raise ValueError("帧数据不完整")
+        yield kind, count, width, view[off:end]
+        off = end
+
+
+def iter_items(payload, count, width):
+    """把帧负载切成定长条目（memoryview切片）"""
+    for i in range(count):
+        yield payload[i * width:(i + 1) * width]
+
+
+def encode_points(kind, points, batch_size=DEFAULT_BATCH):
+    return encode_frames(kind, [point_key(p) for p in points], POINT_SIZE, batch_size)
+
+
+def encode_ciphertexts(kind, enc_values, public_key, batch_size=DEFAULT_BATCH):
+    """只支持整数明文（exponent为0）的密文，按n²字节长度定长编码"""
+    size = ciphertext_size(public_key)
+    items = []
+    for c in enc_values:
+        if c.exponent != 0:
+            raise ValueError("定长密文编码只支持整数明文")
+        items.append(c.ciphertext(False).to_bytes(size, 'big'))
+    return encode_frames(kind, items, size, batch_size)
+
+
+def decode_frames(buf, public_key=None):
+    """把消息解析为 {帧类型: 对象列表}，点帧解码为PointJacobi，密文帧解码为EncryptedNumber"""
+    out = {}
+    for kind, count, width, payload in iter_frames(buf):
+        items = out.setdefault(kind, [])
+        if kind == P2_CIPHERTEXTS or kind == SUM_CIPHERTEXT:
+            items.extend(paillier.EncryptedNumber(public_key, int.from_bytes(c, 'big'))
+                         for c in iter_items(payload, count, width))
+        else:
+            items.extend(deserialize_point(p) for p in iter_items(payload, count, width))
+    return out
+
+
+# 各轮消息
+def encode_round1(points, batch_size=DEFAULT_BATCH):
+    return encode_points(ROUND1_POINTS, points, batch_size)
+
+
+def decode_round1(buf):
+    return decode_frames(buf).get(ROUND1_POINTS, [])
+
+
+def _flatten(values):
+    """多列时每个元素是一组密文，按元素顺序展开"""
+    if values and isinstance(values[0], (tuple, list)):
+        return [c for group in values for c in group]
+    return list(values)
+
+
+def _regroup(values, groups):
+    if groups is None:
+        return values
+    return [tuple(values[i:i + groups]) for i in range(0, len(values), groups)]
+
+
+def encode_round2(dual_points, p2_points, p2_enc_values, public_key, batch_size=DEFAULT_BATCH):
+    """只求交集大小时p2_enc_values为None，消息中没有密文帧"""
+    msg = encode_points(DUAL_POINTS, dual_points, batch_size) + encode_points(P2_POINTS, p2_points, batch_size)
+    if p2_enc_values is not None:
+        msg += encode_ciphertexts(P2_CIPHERTEXTS, _flatten(p2_enc_values), public_key, batch_size)
+    return msg
+
+
+def decode_round2(buf, public_key, groups=None):
+    """多列时groups为每个元素的密文个数，单列时为None；消息中没有密文帧（只求交集大小）时密文为None"""
+    msg = decode_frames(buf, public_key)
+    enc_values = msg.get(P2_CIPHERTEXTS)
+    if enc_values is not None:
+        enc_values = _regroup(enc_values, groups)
+    return msg.get(DUAL_POINTS, []), msg.get(P2_POINTS, []), enc_values
+
+
+def encode_round3(sum_ciphertext, public_key):
+    if sum_ciphertext is None:  # 只求交集大小
+        return b''
+    sums = sum_ciphertext if isinstance(sum_ciphertext, list) else [sum_ciphertext]
+    return encode_ciphertexts(SUM_CIPHERTEXT, sums, public_key)
+
+
+def decode_round3(buf, public_key, groups=None):
+    """没有同态和帧（只求交集大小）时返回None"""
+    sums = decode_frames(buf, public_key).get(SUM_CIPHERTEXT)
+    if sums is None:
+        return None
+    return sums if groups is not None else sums[0]
+
+
+# 测试示例
+if __name__ == "__main__":
+    p1_set = [f"id{i}" for i in range(40)]
+    p2_set = [(f"id{i}", i) for i in range(20, 60)]
+
+    protocol = DDHPrivateIntersectionSum(p1_set, p2_set)
+    pub = protocol.paillier_pub
+
+    msg1 = encode_round1(protocol.round1_p1())
+    msg2 = encode_round2(*protocol.round2_p2(decode_round1(msg1)), pub)
+    msg3 = encode_round3(protocol.round3_p1(*decode_round2(msg2, pub)), pub)
+    intersection_size, intersection_sum = protocol.final_output_p2(decode_round3(msg3, pub))
+    protocol.close()
+
+    print(f"交集大小: {intersection_size}")  # 应输出20
+    print(f"交集值总和: {intersection_sum}")  # 应输出sum(range(20, 40))
+    legacy = len(pickle.dumps(decode_round1(msg1)))
+    print(f"round1消息: {len(msg1)}字节（pickle PointJacobi列表为{legacy}字节）")
+    print(f"round2消息: {len(msg2)}字节, round3消息: {len(msg3)}字节")